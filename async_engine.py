@@ -0,0 +1,258 @@
+import os
+import asyncio
+import signal
+import time
+from link_control import HandoverStager, batch_command, load_trace, shaping_commands
+from run_log import RunLog
+
+TICK_MS = 100
+REPORT_INTERVAL_TICKS = 600
+
+class CommandChannel:
+    # One long-lived shell per namespace; every submitted batch is tagged
+    # with a sequence number so replies can be matched without blocking.
+    def __init__(self, pid, name):
+        self.pid = pid
+        self.name = name
+        self.proc = None
+        self.reader = None
+        self.pending = {}
+        self.seq = 0
+
+    async def open(self):
+        # A session of its own lets a restart kill a hung tc with the shell.
+        self.proc = await asyncio.create_subprocess_exec(
+            'mnexec', '-a', str(self.pid), 'sh',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            start_new_session=True
+        )
+        self.pending = {}
+        self.reader = asyncio.create_task(self.read_replies(self.proc, self.pending))
+
+    def submit(self, cmds):
+        self.seq += 1
+        future = asyncio.get_running_loop().create_future()
+        self.pending[self.seq] = future
+        # Keep the last failing exit code of the batch, not just the status
+        # of its final command.
+        script = 'rc=0\n' + ''.join(f'{cmd} || rc=$?\n' for cmd in cmds) + f'echo __done__ {self.seq} $rc\n'
+        self.proc.stdin.write(script.encode())
+        return future
+
+    async def read_replies(self, proc, pending):
+        output = []
+        while True:
+            line = await proc.stdout.readline()
+            if not line:
+                break
+            line = line.decode().rstrip('\n')
+            if line.startswith('__done__ '):
+                _, seq, rc = line.split()
+                future = pending.pop(int(seq), None)
+                if future is not None and not future.done():
+                    future.set_result((int(rc), output))
+                output = []
+            else:
+                output.append(line)
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"Command channel for {self.name} closed."))
+        pending.clear()
+
+    async def restart(self, proc):
+        # Several links of the namespace may miss the same deadline; only the
+        # first one replaces the shell they were all waiting on.
+        if self.proc is not proc:
+            return
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+        await self.open()
+
+    async def close(self):
+        if self.proc is not None and self.proc.returncode is None:
+            self.proc.stdin.close()
+            await self.proc.wait()
+
+class AsyncLinkController:
+    def __init__(self, channel, dev, column, data_file, deadline_ms, prestage_handovers=True, run_log=None, link_index=0):
+        self.channel = channel
+        self.run_log = run_log
+        self.link_index = link_index
+        self.dev = dev
+        self.column = column
+        self.data_file = data_file
+        self.trace = load_trace(data_file)
+        self.deadline_ms = deadline_ms
+        self.handover_steps = self.trace.find_handover_steps(column) if prestage_handovers else set()
+        self.stager = HandoverStager(dev)
+        self.staged_line = None
+        self.stage_task = None
+        self.in_flight = None
+        self.applied = 0
+        self.skipped = 0
+        self.late = 0
+        self.max_latency_ms = 0.0
+
+    async def submit_by(self, cmds, deadline_ms, what):
+        # The deadline is enforced: a batch still running when it expires has
+        # its shell killed and replaced, so a hung tc cannot block this link
+        # (or staged handovers queued behind it) on every later tick.
+        proc = self.channel.proc
+        future = self.channel.submit(cmds)
+        try:
+            return await asyncio.wait_for(future, max(0, deadline_ms / 1000 - time.time()))
+        except asyncio.TimeoutError:
+            self.late += 1
+            print(f"[{self.dev}] {what} missed its deadline; restarting the {self.channel.name} command channel.")
+            await self.channel.restart(proc)
+            return None
+
+    async def initialize(self, virtual_timestamp):
+        effective_timestamp = self.trace.effective_timestamp(virtual_timestamp)
+        line_num = self.trace.closest_line_number(effective_timestamp)
+        bw, delay, loss, jitter = self.trace.link_params(line_num, self.column)
+        start_ns = time.perf_counter_ns()
+        rc, output = await self.channel.submit(shaping_commands(self.dev, bw, delay, loss, jitter, initial=True))
+        self.log(virtual_timestamp, bw, delay, loss, time.perf_counter_ns() - start_ns)
+        if rc != 0:
+            print(f"[{self.dev}] Initial tc setup failed: {' '.join(output)}")
+
+    def tick(self, virtual_timestamp, tick_wall_ms):
+        next_line = self.trace.find_line_number(self.trace.effective_timestamp(virtual_timestamp + TICK_MS))
+        if next_line in self.handover_steps:
+            params = self.trace.link_params(next_line, self.column)
+            self.stage_task = asyncio.create_task(self.stage(params, virtual_timestamp + TICK_MS, tick_wall_ms + TICK_MS))
+
+        staged_line = self.staged_line
+        self.staged_line = next_line if next_line in self.handover_steps else None
+        if self.in_flight is not None and not self.in_flight.done():
+            self.skipped += 1
+            return
+        effective_timestamp = self.trace.effective_timestamp(virtual_timestamp)
+        line_num = self.trace.find_line_number(effective_timestamp)
+        if line_num is None:
+            print(f"[{self.data_file}] Virtual timestamp {virtual_timestamp} ms not found in data file.")
+            return
+        if line_num == staged_line:
+            return
+        params = self.trace.link_params(line_num, self.column)
+        self.in_flight = asyncio.create_task(self.apply(params, virtual_timestamp, tick_wall_ms + self.deadline_ms))
+
+    def log(self, virtual_timestamp, bw, delay, loss, tc_latency_ns):
+        if self.run_log is not None:
+            self.run_log.append(self.link_index, time.time_ns(), virtual_timestamp, bw, delay, loss, tc_latency_ns)
+
+    async def stage(self, params, virtual_timestamp, boundary_ms):
+        bw, delay, loss, jitter = params
+        delay_s = self.stager.issue_time_ms(boundary_ms) / 1000 - time.time()
+        if delay_s > 0:
+            await asyncio.sleep(delay_s)
+        issued_ms = time.time() * 1000
+        start_ns = time.perf_counter_ns()
+        try:
+            result = await self.submit_by([batch_command(shaping_commands(self.dev, bw, delay, loss, jitter))],
+                                          boundary_ms + self.deadline_ms, 'Staged handover')
+        except ConnectionError as e:
+            print(f"[{self.dev}] {e}")
+            return
+        if result is None:
+            return
+        rc, output = result
+        self.log(virtual_timestamp, bw, delay, loss, time.perf_counter_ns() - start_ns)
+        self.stager.record(virtual_timestamp, boundary_ms, issued_ms, time.time() * 1000)
+        if rc != 0:
+            print(f"[{self.dev}] Staged handover failed: {' '.join(output)}")
+
+    async def apply(self, params, virtual_timestamp, deadline_ms):
+        bw, delay, loss, jitter = params
+        start_ns = time.perf_counter_ns()
+        try:
+            result = await self.submit_by(shaping_commands(self.dev, bw, delay, loss, jitter), deadline_ms, 'tc update')
+        except ConnectionError as e:
+            print(f"[{self.dev}] {e}")
+            return
+        if result is None:
+            return
+        rc, output = result
+        latency_ns = time.perf_counter_ns() - start_ns
+        self.log(virtual_timestamp, bw, delay, loss, latency_ns)
+        latency_ms = latency_ns / 1e6
+        self.applied += 1
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        if rc != 0:
+            print(f"[{self.dev}] tc update failed: {' '.join(output)}")
+
+    def report(self):
+        print(f"[async] {self.dev}: applied {self.applied}, late {self.late}, skipped {self.skipped}, "
+              f"max tc latency {self.max_latency_ms:.1f} ms")
+        self.applied = 0
+        self.skipped = 0
+        self.late = 0
+        self.max_latency_ms = 0.0
+
+async def run_engine(net, link_specs, start_time=None, deadline_ms=80, prestage_handovers=True, run_log_dir=None, on_ready=None):
+    channels = {}
+    controllers = []
+    run_log = None
+    if run_log_dir:
+        run_log = RunLog(os.path.join(run_log_dir, 'async.bin'), [dev for _, dev, _, _ in link_specs])
+    for link_index, (host_name, dev, column, data_file) in enumerate(link_specs):
+        if host_name not in channels:
+            channel = CommandChannel(net.get(host_name).pid, host_name)
+            await channel.open()
+            channels[host_name] = channel
+        controllers.append(AsyncLinkController(channels[host_name], dev, column, data_file, deadline_ms, prestage_handovers, run_log, link_index))
+
+    start_wall_ms = (int(time.time() * 1000) // TICK_MS) * TICK_MS
+    if start_time is not None:
+        start_virtual = start_time
+    else:
+        start_virtual = start_wall_ms % (60 * 1000)
+    print(f"[async] Virtual time starts at {start_virtual} ms at wall time {start_wall_ms} ms")
+
+    await asyncio.gather(*(controller.initialize(start_virtual) for controller in controllers))
+    if on_ready is not None:
+        on_ready()
+
+    tick = 0
+    max_lateness_ms = 0
+    missed_ticks = 0
+    try:
+        while True:
+            tick += 1
+            tick_wall_ms = start_wall_ms + tick * TICK_MS
+            delay_s = tick_wall_ms / 1000 - time.time()
+            if delay_s > 0:
+                await asyncio.sleep(delay_s)
+
+            current_time_ms = int(time.time() * 1000)
+            current_tick = (current_time_ms - start_wall_ms) // TICK_MS
+            if current_tick > tick:
+                missed_ticks += current_tick - tick
+                tick = current_tick
+                tick_wall_ms = start_wall_ms + tick * TICK_MS
+            max_lateness_ms = max(max_lateness_ms, current_time_ms - tick_wall_ms)
+
+            virtual_timestamp = start_virtual + tick * TICK_MS
+            for controller in controllers:
+                controller.tick(virtual_timestamp, tick_wall_ms)
+
+            if tick % REPORT_INTERVAL_TICKS == 0:
+                print(f"[async] tick {tick}: max tick lateness {max_lateness_ms} ms, missed ticks {missed_ticks}")
+                for controller in controllers:
+                    controller.report()
+                max_lateness_ms = 0
+                missed_ticks = 0
+    finally:
+        for channel in channels.values():
+            await channel.close()
+        if run_log is not None:
+            run_log.close()
+
+def run_async_engine(net, link_specs, start_time=None, deadline_ms=80, prestage_handovers=True, run_log_dir=None, on_ready=None):
+    asyncio.run(run_engine(net, link_specs, start_time, deadline_ms, prestage_handovers, run_log_dir, on_ready))
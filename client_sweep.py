@@ -0,0 +1,110 @@
+import os
+import re
+import sys
+import json
+import signal
+import argparse
+import threading
+import subprocess
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STOP_GRACE_S = 10
+
+# Lateness lines each engine prints once a minute.
+THREAD_REPORT = re.compile(r'^\[update\] (\d+) hosts, last \d+ ticks done after the boundary: mean ([\d.]+) ms, p50 ([\d.]+) ms, p99 ([\d.]+) ms, max ([\d.]+) ms')
+ASYNC_REPORT = re.compile(r'^\[async\] tick \d+: max tick lateness (-?\d+) ms, missed ticks (\d+)')
+PROCESS_REPORT = re.compile(r'^\[process\] \S+: applied \d+, late \d+, mean lateness (-?[\d.]+) ms, max lateness (-?\d+) ms')
+
+def run_emulator(clients, engine, duration, profiles, instance):
+    # Unbuffered, or the once-a-minute reports sit in the child's pipe buffer
+    # and are lost when it is stopped.
+    cmd = [sys.executable, '-u', 'emulator.py', '--clients', str(clients), '--engine', engine, '--instance', str(instance)]
+    if profiles:
+        cmd += ['--test_profiles'] + profiles
+    proc = subprocess.Popen(cmd, cwd=SCRIPT_DIR, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, text=True, start_new_session=True,
+                            env={**os.environ, 'PYTHONUNBUFFERED': '1'})
+    lines = []
+    reader = threading.Thread(target=lambda: lines.extend(line.rstrip('\n') for line in proc.stdout), daemon=True)
+    reader.start()
+    try:
+        proc.wait(timeout=duration)
+    except subprocess.TimeoutExpired:
+        stop(proc)
+    reader.join(timeout=5)
+    subprocess.run(['mn', '-c'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return lines
+
+def stop(proc):
+    # The controller threads never exit on their own, so SIGINT and SIGTERM
+    # each get a grace period before the group is killed.
+    for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, signum)
+        except ProcessLookupError:
+            break
+        try:
+            proc.wait(timeout=STOP_GRACE_S)
+            break
+        except subprocess.TimeoutExpired:
+            continue
+    proc.wait()
+
+def summarize(lines):
+    means = []
+    maxima = []
+    p99s = []
+    for line in lines:
+        match = THREAD_REPORT.match(line)
+        if match:
+            means.append(float(match.group(2)))
+            p99s.append(float(match.group(4)))
+            maxima.append(float(match.group(5)))
+            continue
+        match = ASYNC_REPORT.match(line)
+        if match:
+            maxima.append(float(match.group(1)))
+            continue
+        match = PROCESS_REPORT.match(line)
+        if match:
+            means.append(float(match.group(1)))
+            maxima.append(float(match.group(2)))
+    return {
+        'reports': len(maxima),
+        'mean_lateness_ms': sum(means) / len(means) if means else None,
+        'p99_lateness_ms': max(p99s) if p99s else None,
+        'max_lateness_ms': max(maxima) if maxima else None,
+    }
+
+def fmt(value):
+    return f'{value:8.1f}' if value is not None else f"{'-':>8}"
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure tick lateness of the emulator for several fan-out client counts')
+    parser.add_argument('--clients', type=int, nargs='+', default=[0, 10, 40], help='Client counts to sweep')
+    parser.add_argument('--engine', choices=['thread', 'async', 'process'], default='thread')
+    parser.add_argument('--duration', type=int, default=150, help='Seconds per run; lateness is reported once a minute')
+    parser.add_argument('--test_profiles', nargs='*', default=['smoke'], help='Measurement profiles to load the links with during each run')
+    parser.add_argument('--instance', type=int, default=9, help='Emulator instance number used for the sweep')
+    parser.add_argument('--output', default=None, help='Optional JSON file for the results')
+    args = parser.parse_args()
+
+    results = []
+    for clients in args.clients:
+        print(f"Running the {args.engine} engine with {clients} clients for {args.duration} s")
+        lines = run_emulator(clients, args.engine, args.duration, args.test_profiles, args.instance)
+        result = {'clients': clients, 'engine': args.engine, **summarize(lines)}
+        if result['reports'] == 0:
+            print(f"No lateness reports with {clients} clients; the last lines were:")
+            for line in lines[-10:]:
+                print(f"  {line}")
+        results.append(result)
+
+    print(f"\n{'clients':>8}{'reports':>8}{'mean ms':>8}{'p99 ms':>8}{'max ms':>8}")
+    for result in results:
+        print(f"{result['clients']:>8}{result['reports']:>8}{fmt(result['mean_lateness_ms'])}"
+              f"{fmt(result['p99_lateness_ms'])}{fmt(result['max_lateness_ms'])}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def stages(work_dir):
+    inputs = os.path.join(work_dir, 'inputs')
+    outputs = os.path.join(work_dir, 'outputs')
+    irtt_csv = os.path.join(outputs, 'irtt.csv')
+    iperf3_csv = os.path.join(outputs, 'iperf3.csv')
+    combined_csv = os.path.join(outputs, 'combined.csv')
+    final_csv = os.path.join(outputs, 'trace.csv')
+    # Stage name, script arguments, output files and whether the first
+    # output has a header row.
+    return [
+        ('process_irtt', ['process_irtt.py', os.path.join(inputs, 'irtt'), irtt_csv], [irtt_csv], True),
+        ('process_iperf3', ['process_iperf3.py', os.path.join(inputs, 'iperf3'), iperf3_csv], [iperf3_csv], True),
+        ('combine', ['combine.py', irtt_csv, iperf3_csv, combined_csv], [combined_csv], True),
+        ('data_process', ['data_process.py', combined_csv, final_csv],
+         [final_csv, os.path.join(outputs, 'trace.jitter.csv')], False),
+    ]
+
+def sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def count_rows(path, header):
+    with open(path, 'rb') as f:
+        rows = sum(1 for _ in f)
+    return rows - 1 if header else rows
+
+def run_stage(args):
+    # wait4 gives the child's own peak RSS rather than the largest of all
+    # children so far, which is what getrusage(RUSAGE_CHILDREN) reports. The
+    # child's figure starts from this process's size at fork, so the runner
+    # itself stays free of numpy and pandas.
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable] + args, cwd=SCRIPT_DIR, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{args[0]} exited with code {proc.returncode}")
+    return elapsed, usage.ru_maxrss / 1024
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR, text=True).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=SCRIPT_DIR, text=True).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+def run_benchmark(work_dir, config, repeat):
+    os.makedirs(os.path.join(work_dir, 'outputs'), exist_ok=True)
+    results = {'commit': git_commit(), 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'config': config, 'stages': {}}
+    for name, args, outputs, header in stages(work_dir):
+        runs = [run_stage(args) for _ in range(repeat)]
+        wall_s = min(run[0] for run in runs)
+        max_rss_mb = max(run[1] for run in runs)
+        rows = count_rows(outputs[0], header)
+        results['stages'][name] = {
+            'wall_s': wall_s,
+            'max_rss_mb': max_rss_mb,
+            'rows': rows,
+            'rows_per_s': rows / wall_s,
+            'sha256': {os.path.basename(path): sha256(path) for path in outputs if os.path.exists(path)},
+        }
+        print(f"{name:<15}{wall_s:>9.2f} s{max_rss_mb:>9.0f} MB{rows:>10} rows{rows / wall_s:>12.0f} rows/s")
+    return results
+
+def compare(results, baseline, max_slowdown):
+    problems = []
+    same_inputs = results['config'] == baseline['config']
+    if not same_inputs:
+        print('Input configurations differ; outputs are not compared.')
+    print(f"\nAgainst {baseline['commit']} ({baseline['date']}):")
+    for name, stage in results['stages'].items():
+        if name not in baseline['stages']:
+            continue
+        old = baseline['stages'][name]
+        speedup = old['wall_s'] / stage['wall_s']
+        print(f"{name:<15}{old['wall_s']:>9.2f} s -> {stage['wall_s']:.2f} s ({speedup:.2f}x), "
+              f"{old['max_rss_mb']:.0f} MB -> {stage['max_rss_mb']:.0f} MB")
+        if same_inputs and stage['sha256'] != old['sha256']:
+            problems.append(f"{name} output differs from {baseline['commit']}")
+        if max_slowdown is not None and stage['wall_s'] > old['wall_s'] * max_slowdown:
+            problems.append(f"{name} is {1 / speedup:.2f}x slower than {baseline['commit']}")
+    return problems
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the data processing scripts on synthetic captures')
+    parser.add_argument('--work_dir', default='./bench_work', help='Directory for generated inputs and stage outputs')
+    parser.add_argument('--duration_s', type=int, default=3600, help='Length of the synthetic capture')
+    parser.add_argument('--loss', type=float, default=0.01)
+    parser.add_argument('--burst', type=float, default=3.0)
+    parser.add_argument('--gap_every_s', type=int, default=1800)
+    parser.add_argument('--gap_s', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per stage; the fastest is reported')
+    parser.add_argument('--output', default=None, help='Write the results as JSON, e.g. bench_results/<commit>.json')
+    parser.add_argument('--compare', default=None, help='Results JSON from an earlier commit to compare against')
+    parser.add_argument('--max_slowdown', type=float, default=None, help='Fail when a stage is this many times slower than --compare')
+    args = parser.parse_args()
+
+    config = {
+        'duration_s': args.duration_s,
+        'loss': args.loss,
+        'burst': args.burst,
+        'gap_every_s': args.gap_every_s,
+        'gap_s': args.gap_s,
+        'seed': args.seed,
+    }
+    work_dir = os.path.abspath(args.work_dir)
+    config_file = os.path.join(work_dir, 'inputs', 'config.json')
+    if os.path.exists(config_file):
+        with open(config_file) as f:
+            existing = json.load(f)
+    else:
+        existing = None
+    if existing != config:
+        print(f'Generating {args.duration_s} s of synthetic captures in {args.work_dir}')
+        inputs = os.path.join(work_dir, 'inputs')
+        for sub in ('irtt', 'iperf3'):
+            sub_dir = os.path.join(inputs, sub)
+            if os.path.isdir(sub_dir):
+                for filename in os.listdir(sub_dir):
+                    os.remove(os.path.join(sub_dir, filename))
+        subprocess.run([sys.executable, 'synth_inputs.py', inputs, '--duration_s', str(args.duration_s),
+                        '--loss', str(args.loss), '--burst', str(args.burst), '--gap_every_s', str(args.gap_every_s),
+                        '--gap_s', str(args.gap_s), '--seed', str(args.seed)], cwd=SCRIPT_DIR, check=True)
+        with open(config_file, 'w') as f:
+            json.dump(config, f)
+
+    results = run_benchmark(work_dir, config, args.repeat)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        problems = compare(results, baseline, args.max_slowdown)
+        if problems:
+            print('\nBenchmark check failed:')
+            for problem in problems:
+                print(f'  {problem}')
+            sys.exit(1)
@@ -1,4 +1,20 @@
+import io
+import os
+import sys
 import csv
+from bisect import bisect_left, bisect_right
+from multiprocessing import get_context
+
+delay_percentile_columns = ['uplink_delay_p10_ms', 'uplink_delay_p50_ms', 'uplink_delay_p90_ms',
+                            'downlink_delay_p10_ms', 'downlink_delay_p50_ms', 'downlink_delay_p90_ms']
+fieldnames = ['uplink_throughput_Mbps', 'downlink_throughput_Mbps',
+              'uplink_delay_ms', 'downlink_delay_ms',
+              'uplink_packet_loss', 'downlink_packet_loss', 'wall_time_ns'] + delay_percentile_columns
+
+MAX_FILL_GAP_NS = 5 * 60 * 1_000_000_000
+SHARD_NS = 3600 * 1_000_000_000
+
+shard_input = None
 
 def read_irtt_data(irtt_csv_file):
     irtt_data = []
@@ -11,12 +27,18 @@ def read_irtt_data(irtt_csv_file):
                 uplink_packet_loss = float(row['uplink_packet_loss'])
                 downlink_packet_loss = float(row['downlink_packet_loss'])
                 wall_time_ns = int(float(row['wall_time_ns']))
+                # Older irtt CSVs have no percentiles; they get zero jitter.
+                percentiles = {
+                    column: float(row[column]) if row.get(column) else (uplink_delay_ms if column.startswith('uplink') else downlink_delay_ms)
+                    for column in delay_percentile_columns
+                }
                 irtt_data.append({
                     'uplink_delay_ms': uplink_delay_ms,
                     'downlink_delay_ms': downlink_delay_ms,
                     'uplink_packet_loss': uplink_packet_loss,
                     'downlink_packet_loss': downlink_packet_loss,
-                    'wall_time_ns': wall_time_ns
+                    'wall_time_ns': wall_time_ns,
+                    **percentiles
                 })
             except ValueError:
                 continue
@@ -58,7 +80,13 @@ def find_closest_iperf_entry(iperf_data, irtt_wall_time_ns, tolerance_ns, start_
         search_index += 1
     return closest_entry, index
 
-def combine_data(irtt_data, iperf_data, output_csv_file, tolerance_ns=40_000_000):
+def combine_interval_rows(irtt_data, iperf_data, tolerance_ns=40_000_000, owner_start=None, owner_end=None):
+    # Rows are owned by the shard their interval (or, for filled rows, the
+    # interval before the gap) falls in; irtt_data may reach past owner_end
+    # so gaps crossing the shard edge still see their far side.
+    def owned(wall_time_ns):
+        return (owner_start is None or wall_time_ns >= owner_start) and (owner_end is None or wall_time_ns < owner_end)
+
     combined_dict = {}
     iperf_index = 0
     for irtt_entry in irtt_data:
@@ -78,6 +106,7 @@ def combine_data(irtt_data, iperf_data, output_csv_file, tolerance_ns=40_000_000
                         'uplink_packet_loss': irtt_entry['uplink_packet_loss'],
                         'downlink_packet_loss': irtt_entry['downlink_packet_loss'],
                         'wall_time_ns': interval_wall_time_ns,
+                        **{column: irtt_entry[column] for column in delay_percentile_columns},
                         'iperf_wall_time_ns': irtt_wall_time_ns
                     }
             else:
@@ -89,6 +118,7 @@ def combine_data(irtt_data, iperf_data, output_csv_file, tolerance_ns=40_000_000
                     'uplink_packet_loss': irtt_entry['uplink_packet_loss'],
                     'downlink_packet_loss': irtt_entry['downlink_packet_loss'],
                     'wall_time_ns': interval_wall_time_ns,
+                    **{column: irtt_entry[column] for column in delay_percentile_columns},
                     'iperf_wall_time_ns': irtt_wall_time_ns
                 }
         else:
@@ -104,6 +134,7 @@ def combine_data(irtt_data, iperf_data, output_csv_file, tolerance_ns=40_000_000
                     'uplink_packet_loss': irtt_entry['uplink_packet_loss'],
                     'downlink_packet_loss': irtt_entry['downlink_packet_loss'],
                     'wall_time_ns': interval_wall_time_ns,
+                    **{column: irtt_entry[column] for column in delay_percentile_columns},
                     'iperf_wall_time_ns': closest_iperf_entry['wall_time_ns']
                 }
     combined_data = list(combined_dict.values())
@@ -111,12 +142,15 @@ def combine_data(irtt_data, iperf_data, output_csv_file, tolerance_ns=40_000_000
     filled_data = []
     n = len(combined_data)
     for i in range(n):
-        filled_data.append(combined_data[i])
+        if owned(combined_data[i]['wall_time_ns']):
+            filled_data.append(combined_data[i])
     for i in range(n - 1):
         current_time = combined_data[i]['wall_time_ns']
         next_time = combined_data[i + 1]['wall_time_ns']
+        if not owned(current_time):
+            continue
         gap = next_time - current_time
-        if gap > 5 * 60 * 1_000_000_000:
+        if gap > MAX_FILL_GAP_NS:
             continue
         expected_time = current_time + 100_000_000
         while expected_time < next_time:
@@ -130,6 +164,7 @@ def combine_data(irtt_data, iperf_data, output_csv_file, tolerance_ns=40_000_000
                     'downlink_delay_ms': (prev_entry['downlink_delay_ms'] + next_entry['downlink_delay_ms']) / 2,
                     'uplink_packet_loss': (prev_entry['uplink_packet_loss'] + next_entry['uplink_packet_loss']) / 2,
                     'downlink_packet_loss': (prev_entry['downlink_packet_loss'] + next_entry['downlink_packet_loss']) / 2,
+                    **{column: (prev_entry[column] + next_entry[column]) / 2 for column in delay_percentile_columns},
                     'wall_time_ns': expected_time
                 }
                 filled_data.append(averaged_entry)
@@ -148,30 +183,61 @@ def combine_data(irtt_data, iperf_data, output_csv_file, tolerance_ns=40_000_000
             unique_data[interval_time] = entry
     final_data = list(unique_data.values())
     final_data.sort(key=lambda x: x['wall_time_ns'])
+    return final_data
+
+def format_rows(final_data):
+    buffer = io.StringIO(newline='')
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    for entry in final_data:
+        writer.writerow({
+            'uplink_throughput_Mbps': f'{entry["uplink_throughput_Mbps"]:.6f}',
+            'downlink_throughput_Mbps': f'{entry["downlink_throughput_Mbps"]:.6f}',
+            'uplink_delay_ms': f'{entry["uplink_delay_ms"]:.6f}',
+            'downlink_delay_ms': f'{entry["downlink_delay_ms"]:.6f}',
+            'uplink_packet_loss': f'{entry["uplink_packet_loss"]:.6f}',
+            'downlink_packet_loss': f'{entry["downlink_packet_loss"]:.6f}',
+            'wall_time_ns': entry['wall_time_ns'],
+            **{column: f'{entry[column]:.6f}' for column in delay_percentile_columns}
+        })
+    return buffer.getvalue()
+
+def combine_shard(bounds):
+    # Runs in a forked worker; the parsed inputs are inherited, not pickled.
+    irtt_data, irtt_times, iperf_data, iperf_times, tolerance_ns = shard_input
+    shard_start, shard_end = bounds
+    irtt_slice = irtt_data[bisect_left(irtt_times, shard_start):bisect_left(irtt_times, shard_end + MAX_FILL_GAP_NS)]
+    iperf_slice = iperf_data[bisect_left(iperf_times, shard_start - tolerance_ns):bisect_right(iperf_times, shard_end + MAX_FILL_GAP_NS + tolerance_ns)]
+    return format_rows(combine_interval_rows(irtt_slice, iperf_slice, tolerance_ns, shard_start, shard_end))
+
+def combine_data(irtt_data, iperf_data, output_csv_file, tolerance_ns=40_000_000, workers=1):
+    global shard_input
+    if workers <= 1 or not irtt_data:
+        parts = [format_rows(combine_interval_rows(irtt_data, iperf_data, tolerance_ns))]
+    else:
+        first = irtt_data[0]['wall_time_ns'] // SHARD_NS * SHARD_NS
+        last = irtt_data[-1]['wall_time_ns']
+        shards = [(start, start + SHARD_NS) for start in range(first, last + 1, SHARD_NS)]
+        shard_input = (irtt_data, [entry['wall_time_ns'] for entry in irtt_data],
+                       iperf_data, [entry['wall_time_ns'] for entry in iperf_data], tolerance_ns)
+        with get_context('fork').Pool(min(workers, len(shards))) as pool:
+            parts = pool.map(combine_shard, shards)
+        shard_input = None
+    # Shards cover consecutive hours and are written in order, so the file is
+    # byte-identical to a single-process run.
     with open(output_csv_file, 'w', newline='') as csvfile:
-        fieldnames = ['uplink_throughput_Mbps', 'downlink_throughput_Mbps',
-                      'uplink_delay_ms', 'downlink_delay_ms',
-                      'uplink_packet_loss', 'downlink_packet_loss', 'wall_time_ns']
         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         writer.writeheader()
-        for entry in final_data:
-            writer.writerow({
-                'uplink_throughput_Mbps': f'{entry["uplink_throughput_Mbps"]:.6f}',
-                'downlink_throughput_Mbps': f'{entry["downlink_throughput_Mbps"]:.6f}',
-                'uplink_delay_ms': f'{entry["uplink_delay_ms"]:.6f}',
-                'downlink_delay_ms': f'{entry["downlink_delay_ms"]:.6f}',
-                'uplink_packet_loss': f'{entry["uplink_packet_loss"]:.6f}',
-                'downlink_packet_loss': f'{entry["downlink_packet_loss"]:.6f}',
-                'wall_time_ns': entry['wall_time_ns']
-            })
+        for part in parts:
+            csvfile.write(part)
     print('Data combining complete.')
 
 if __name__ == '__main__':
-    irtt_csv_file = 'path/to/irtt.csv'
-    iperf_csv_file = 'path/to/iperf3.csv'
-    output_csv_file = 'path/you/want/to/save/combined_output_data.csv'
+    irtt_csv_file = sys.argv[1] if len(sys.argv) > 1 else 'path/to/irtt.csv'
+    iperf_csv_file = sys.argv[2] if len(sys.argv) > 2 else 'path/to/iperf3.csv'
+    output_csv_file = sys.argv[3] if len(sys.argv) > 3 else 'path/you/want/to/save/combined_output_data.csv'
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else os.cpu_count()
 
     irtt_data = read_irtt_data(irtt_csv_file)
     iperf_data = read_iperf_data(iperf_csv_file)
 
-    combine_data(irtt_data, iperf_data, output_csv_file)
+    combine_data(irtt_data, iperf_data, output_csv_file, workers=workers)
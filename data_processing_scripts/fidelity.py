@@ -0,0 +1,207 @@
+import sys
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+columns = ['uplink_throughput_Mbps', 'downlink_throughput_Mbps',
+           'uplink_delay_ms', 'downlink_delay_ms',
+           'uplink_packet_loss', 'downlink_packet_loss']
+delay_columns = ['uplink_delay_ms', 'downlink_delay_ms']
+handover_times_ms = np.array([12000, 27000, 42000, 57000])
+STEP_MS = 100
+
+def read_trace(csv_file):
+    return pd.read_csv(csv_file, header=None, names=columns + ['wall_time'])
+
+def read_measured(csv_file):
+    # The combined.csv of the run, not the data_process.py output: that drops
+    # the first rows and every rejected chunk before renumbering wall_time,
+    # so only wall_time_ns still says when each row was measured.
+    measured = pd.read_csv(csv_file)
+    if 'wall_time_ns' not in measured.columns:
+        raise ValueError(f"{csv_file} has no wall_time_ns column; pass the combine.py output of the run")
+    measured = measured.dropna(subset=columns).reset_index(drop=True)
+    measured['wall_time_ms'] = measured['wall_time_ns'] // 1_000_000 // STEP_MS * STEP_MS
+    return measured
+
+def align(trace, measured, run_start_ms, start_time):
+    # Every engine advances virtual time one step per 100 ms of wall time from
+    # the start it prints, and wraps the trace the same way as here.
+    first = trace['wall_time'].iloc[0]
+    total_duration = trace['wall_time'].iloc[-1] - first + STEP_MS
+    virtual_ts = measured['wall_time_ms'].to_numpy() - run_start_ms + start_time
+    trace_idx = ((virtual_ts - first) % total_duration) // STEP_MS
+    expected = trace[columns].to_numpy()[trace_idx]
+    return virtual_ts, expected, measured[columns].to_numpy()
+
+def estimate_start(trace, measured, column='downlink_delay_ms'):
+    # Circular cross-correlation of the measured series, placed on a 100 ms
+    # grid by wall time, against the whole trace; the peak gives the virtual
+    # timestamp of the first measured row.
+    x = trace[column].to_numpy(dtype=float)
+    n = len(x)
+    wall_ms = measured['wall_time_ms'].to_numpy()
+    steps = (wall_ms - wall_ms[0]) // STEP_MS
+    keep = steps < n
+    values = measured[column].to_numpy(dtype=float)[keep]
+    y = np.zeros(n)
+    y[steps[keep]] = values - values.mean()
+    x = x - x.mean()
+    corr = np.fft.irfft(np.fft.rfft(x, n) * np.conj(np.fft.rfft(y, n)), n)
+    return int(wall_ms[0]), int(np.argmax(corr)) * STEP_MS + int(trace['wall_time'].iloc[0])
+
+def lag_correlation(expected, measured, max_lag):
+    lags = np.arange(-max_lag, max_lag + 1)
+    n = len(expected)
+    best = np.full(expected.shape[1], -np.inf)
+    best_lag = np.zeros(expected.shape[1], dtype=int)
+    for lag in lags:
+        if lag >= 0:
+            e, m = expected[:n - lag], measured[lag:]
+        else:
+            e, m = expected[-lag:], measured[:n + lag]
+        e = e - e.mean(axis=0)
+        m = m - m.mean(axis=0)
+        denom = np.sqrt((e ** 2).sum(axis=0) * (m ** 2).sum(axis=0))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = np.where(denom > 0, (e * m).sum(axis=0) / denom, np.nan)
+        improved = corr > best
+        best = np.where(improved, corr, best)
+        best_lag = np.where(improved, lag, best_lag)
+    return best, best_lag * STEP_MS
+
+def handover_timing(virtual_ts, expected, measured, window, threshold=10.0):
+    # For every handover whose trace delay steps by more than the threshold,
+    # compare where the measured and the expected series have their largest
+    # step within the window; the trace's own step is often beside the
+    # boundary, so the error is relative to it rather than to the boundary.
+    results = {}
+    in_minute = virtual_ts % (60 * 1000)
+    boundaries = np.flatnonzero(np.isin(in_minute, handover_times_ms))
+    boundaries = boundaries[(boundaries > window) & (boundaries < len(virtual_ts) - window)]
+    # Skip boundaries whose window spans a gap in the measurements.
+    contiguous = virtual_ts[boundaries + window] - virtual_ts[boundaries - window - 1] == (2 * window + 1) * STEP_MS
+    boundaries = boundaries[contiguous]
+    offsets = np.arange(-window, window + 1)
+    for column in delay_columns:
+        idx = columns.index(column)
+        trace_step = np.abs(expected[boundaries, idx] - expected[boundaries - 1, idx])
+        steps = boundaries[trace_step > threshold]
+        if len(steps) == 0:
+            results[column] = {'handovers': 0}
+            continue
+        rows = steps[:, None] + offsets[None, :]
+        measured_diff = np.abs(np.diff(measured[:, idx], prepend=measured[0, idx]))
+        expected_diff = np.abs(np.diff(expected[:, idx], prepend=expected[0, idx]))
+        measured_step = offsets[np.argmax(measured_diff[rows], axis=1)]
+        expected_step = offsets[np.argmax(expected_diff[rows], axis=1)]
+        error_ms = (measured_step - expected_step) * STEP_MS
+        results[column] = {
+            'handovers': int(len(steps)),
+            'mean_abs_error_ms': float(np.mean(np.abs(error_ms))),
+            'p50_abs_error_ms': float(np.percentile(np.abs(error_ms), 50)),
+            'p95_abs_error_ms': float(np.percentile(np.abs(error_ms), 95)),
+            'on_step': float(np.mean(error_ms == 0)),
+        }
+    return results
+
+def fidelity_report(trace, measured, run_start_ms, start_time, max_lag=20, handover_window=5):
+    virtual_ts, expected, actual = align(trace, measured, run_start_ms, start_time)
+    error = actual - expected
+    abs_error = np.abs(error)
+    rmse = np.sqrt(np.mean(error ** 2, axis=0))
+    percentiles = np.percentile(abs_error, [50, 95, 99], axis=0)
+    expected_centered = expected - expected.mean(axis=0)
+    actual_centered = actual - actual.mean(axis=0)
+    denom = np.sqrt((expected_centered ** 2).sum(axis=0) * (actual_centered ** 2).sum(axis=0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlation = np.where(denom > 0, (expected_centered * actual_centered).sum(axis=0) / denom, np.nan)
+    best_corr, best_lag_ms = lag_correlation(expected, actual, max_lag)
+
+    report = {
+        'first_virtual_ms': int(virtual_ts[0]),
+        'rows': int(len(actual)),
+        'duration_s': (int(virtual_ts[-1]) - int(virtual_ts[0])) / 1000 + STEP_MS / 1000,
+        'columns': {},
+        'handovers': handover_timing(virtual_ts, expected, actual, handover_window),
+    }
+    for idx, column in enumerate(columns):
+        report['columns'][column] = {
+            'rmse': float(rmse[idx]),
+            'mae': float(abs_error[:, idx].mean()),
+            'bias': float(error[:, idx].mean()),
+            'p50_abs_error': float(percentiles[0, idx]),
+            'p95_abs_error': float(percentiles[1, idx]),
+            'p99_abs_error': float(percentiles[2, idx]),
+            'correlation': float(correlation[idx]),
+            'best_lag_ms': int(best_lag_ms[idx]),
+            'best_lag_correlation': float(best_corr[idx]),
+        }
+    return report
+
+def print_report(name, report):
+    print(f"\n{name}: {report['rows']} rows ({report['duration_s']:.0f} s) first row at virtual timestamp {report['first_virtual_ms']} ms")
+    print(f"{'column':<26}{'rmse':>10}{'mae':>10}{'bias':>10}{'p95':>10}{'corr':>8}{'lag ms':>8}")
+    for column, stats in report['columns'].items():
+        print(f"{column:<26}{stats['rmse']:>10.3f}{stats['mae']:>10.3f}{stats['bias']:>10.3f}"
+              f"{stats['p95_abs_error']:>10.3f}{stats['correlation']:>8.3f}{stats['best_lag_ms']:>8d}")
+    for column, stats in report['handovers'].items():
+        if stats['handovers'] == 0:
+            print(f"{column}: no handover steps in range")
+        else:
+            print(f"{column}: {stats['handovers']} handovers, step timing error mean {stats['mean_abs_error_ms']:.0f} ms, "
+                  f"p95 {stats['p95_abs_error_ms']:.0f} ms, {stats['on_step'] * 100:.0f}% on the trace's step")
+
+def check_thresholds(name, report, max_rmse, max_handover_error_ms):
+    failures = []
+    for column, limit in max_rmse.items():
+        value = report['columns'][column]['rmse']
+        if value > limit:
+            failures.append(f"{name} {column} rmse {value:.3f} > {limit}")
+    if max_handover_error_ms is not None:
+        for column, stats in report['handovers'].items():
+            if stats['handovers'] and stats['p95_abs_error_ms'] > max_handover_error_ms:
+                failures.append(f"{name} {column} p95 handover error {stats['p95_abs_error_ms']:.0f} ms > {max_handover_error_ms} ms")
+    return failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare an emulated run against the trace it replayed')
+    parser.add_argument('--path', nargs=3, action='append', required=True, metavar=('NAME', 'TRACE', 'MEASURED'),
+                        help='Path name, input trace and the combine.py output of the run; repeat for each path')
+    parser.add_argument('--run_start_ms', type=int, default=None, help='Wall time the emulator printed as the start of virtual time; estimated with --start_time when omitted')
+    parser.add_argument('--start_time', type=int, default=None, help='The run\'s --start_time; defaults to the wall time within the minute at --run_start_ms, as in the emulator')
+    parser.add_argument('--max_lag', type=int, default=20, help='Largest lag in 100 ms steps for the cross-correlation search')
+    parser.add_argument('--max_rmse', nargs=2, action='append', default=[], metavar=('COLUMN', 'LIMIT'), help='Fail when a column\'s RMSE exceeds the limit')
+    parser.add_argument('--max_handover_error_ms', type=float, default=None, help='Fail when the p95 handover step timing error exceeds this')
+    parser.add_argument('--report', default=None, help='Write the full report as JSON')
+    args = parser.parse_args()
+
+    max_rmse = {column: float(limit) for column, limit in args.max_rmse}
+    reports = {}
+    failures = []
+    for name, trace_file, measured_file in args.path:
+        trace = read_trace(trace_file)
+        try:
+            measured = read_measured(measured_file)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        if args.run_start_ms is not None:
+            run_start_ms = args.run_start_ms
+            start_time = args.start_time if args.start_time is not None else run_start_ms % (60 * 1000)
+        else:
+            run_start_ms, start_time = estimate_start(trace, measured)
+        reports[name] = fidelity_report(trace, measured, run_start_ms, start_time, args.max_lag)
+        print_report(name, reports[name])
+        failures.extend(check_thresholds(name, reports[name], max_rmse, args.max_handover_error_ms))
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+    if failures:
+        print('\nFidelity check failed:')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 import csv
 import glob
@@ -27,21 +28,24 @@ def process_iperf_data(folder_path, output_csv):
                     downlink_throughput_Mbps = None
                     wall_time_ns = None
 
-                    sender_stream = None
-                    receiver_stream = None
+                    sender_streams = []
+                    receiver_streams = []
 
+                    # Runs with -P report one stream per connection and
+                    # direction; the link carried their sum.
                     streams = interval.get('streams', [])
                     for stream in streams:
                         if stream.get('sender') == True:
-                            sender_stream = stream
+                            sender_streams.append(stream)
                         elif stream.get('sender') == False:
-                            receiver_stream = stream
+                            receiver_streams.append(stream)
 
-                    if sender_stream is not None and receiver_stream is not None:
-                        bits_per_second_uplink = sender_stream.get('bits_per_second', 0)
+                    if sender_streams and receiver_streams:
+                        sender_stream = sender_streams[0]
+                        bits_per_second_uplink = sum(stream.get('bits_per_second', 0) for stream in sender_streams)
                         uplink_throughput_Mbps = bits_per_second_uplink / 1e6
 
-                        bits_per_second_downlink = receiver_stream.get('bits_per_second', 0)
+                        bits_per_second_downlink = sum(stream.get('bits_per_second', 0) for stream in receiver_streams)
                         downlink_throughput_Mbps = bits_per_second_downlink / 1e6
 
                         start_time = sender_stream.get('start', 0)
@@ -110,8 +114,8 @@ def fill_zeros_in_csv(csv_input, csv_output):
             ])
 
 if __name__ == '__main__':
-    folder_path = 'path/to/iperf3/directory'
-    output_csv = 'path/you/want/to/save/iperf3.csv'
+    folder_path = sys.argv[1] if len(sys.argv) > 1 else 'path/to/iperf3/directory'
+    output_csv = sys.argv[2] if len(sys.argv) > 2 else 'path/you/want/to/save/iperf3.csv'
 
     process_iperf_data(folder_path, output_csv)
     print('iperf3 processing complete.')
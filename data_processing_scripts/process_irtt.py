@@ -1,7 +1,20 @@
 import os
+import sys
 import json
 import csv
 import glob
+import statistics
+
+delay_percentile_columns = ['uplink_delay_p10_ms', 'uplink_delay_p50_ms', 'uplink_delay_p90_ms',
+                            'downlink_delay_p10_ms', 'downlink_delay_p50_ms', 'downlink_delay_p90_ms']
+
+def delay_percentiles(delays_ms):
+    # p10, p50 and p90 of every round trip in the interval, kept alongside the
+    # single sample closest to the boundary so the emulator can apply jitter.
+    if len(delays_ms) == 1:
+        return delays_ms * 3
+    deciles = statistics.quantiles(delays_ms, n=10, method='inclusive')
+    return [deciles[0], deciles[4], deciles[8]]
 
 def process_irtt_data(folder_path, output_csv):
     interval_data = {}
@@ -53,7 +66,9 @@ def process_irtt_data(folder_path, output_csv):
                         'total_packets': 0,
                         'uplink_lost_packets': 0,
                         'downlink_lost_packets': 0,
-                        'lost_wall_times_ns': []
+                        'lost_wall_times_ns': [],
+                        'uplink_delays_ms': [],
+                        'downlink_delays_ms': []
                     }
 
                 interval_data[key]['total_packets'] += 1
@@ -68,6 +83,10 @@ def process_irtt_data(folder_path, output_csv):
                     interval_data[key]['downlink_lost_packets'] += 1
 
                 if not (is_lost_up or is_lost_down):
+                    if uplink_delay_ns is not None and downlink_delay_ns is not None:
+                        interval_data[key]['uplink_delays_ms'].append(uplink_delay_ns / 1_000_000)
+                        interval_data[key]['downlink_delays_ms'].append(downlink_delay_ns / 1_000_000)
+
                     target_ms = interval_index * INTERVAL_MS
                     distance_to_target = abs(ms_within_sec - target_ms)
 
@@ -93,6 +112,7 @@ def process_irtt_data(folder_path, output_csv):
             downlink_delay_ms = 200.0
             uplink_packet_loss = 1.0
             downlink_packet_loss = 1.0
+            percentiles = [200.0] * 6
 
             target_wall_time_ns = (key[0] * 1_000_000_000) + (key[1] * INTERVAL_MS * 1_000_000)
 
@@ -114,20 +134,25 @@ def process_irtt_data(folder_path, output_csv):
             wall_time_ns = data_point['wall_time_ns'] if data_point['wall_time_ns'] is not None else (
                 (key[0] * 1_000_000_000) + (key[1] * INTERVAL_MS * 1_000_000)
             )
+            if data_point['uplink_delays_ms']:
+                percentiles = delay_percentiles(data_point['uplink_delays_ms']) + delay_percentiles(data_point['downlink_delays_ms'])
+            else:
+                percentiles = [uplink_delay_ms] * 3 + [downlink_delay_ms] * 3
 
         processed_data.append({
             'uplink_delay_ms': uplink_delay_ms,
             'downlink_delay_ms': downlink_delay_ms,
             'uplink_packet_loss': uplink_packet_loss,
             'downlink_packet_loss': downlink_packet_loss,
-            'wall_time_ns': wall_time_ns
+            'wall_time_ns': wall_time_ns,
+            'delay_percentiles_ms': percentiles
         })
 
     sorted_data = sorted(processed_data, key=lambda x: x['wall_time_ns'])
 
     with open(output_csv, 'w', newline='') as csvfile:
         csv_writer = csv.writer(csvfile)
-        csv_writer.writerow(['uplink_delay_ms', 'downlink_delay_ms', 'uplink_packet_loss', 'downlink_packet_loss', 'wall_time_ns'])
+        csv_writer.writerow(['uplink_delay_ms', 'downlink_delay_ms', 'uplink_packet_loss', 'downlink_packet_loss', 'wall_time_ns'] + delay_percentile_columns)
 
         for data_point in sorted_data:
             csv_writer.writerow([
@@ -136,11 +161,11 @@ def process_irtt_data(folder_path, output_csv):
                 f'{data_point["uplink_packet_loss"]:.6f}',
                 f'{data_point["downlink_packet_loss"]:.6f}',
                 data_point['wall_time_ns']
-            ])
+            ] + [f'{value:.6f}' for value in data_point['delay_percentiles_ms']])
 
     print('Data processing complete.')
 
 if __name__ == '__main__':
-    folder_path = 'path/to/irtt/directory'
-    output_csv = 'path/you/want/to/save/irtt.csv'
+    folder_path = sys.argv[1] if len(sys.argv) > 1 else 'path/to/irtt/directory'
+    output_csv = sys.argv[2] if len(sys.argv) > 2 else 'path/you/want/to/save/irtt.csv'
     process_irtt_data(folder_path, output_csv)
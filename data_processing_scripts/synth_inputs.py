@@ -0,0 +1,112 @@
+import os
+import json
+import argparse
+import numpy as np
+from synth_trace import generate_loss
+
+START_S = 1704067200
+SLOT_MS = 15000
+SLOT_ALIGN_MS = 12000
+IPERF3_INTERVAL_S = 0.1
+
+def slot_levels(rng, t_ms, low, high):
+    # One level per 15 s handover slot, so delay and throughput step on the
+    # 12/27/42/57 s schedule like the recorded captures.
+    slots = (t_ms - SLOT_ALIGN_MS) // SLOT_MS
+    first = slots.min()
+    levels = rng.uniform(low, high, slots.max() - first + 1)
+    return levels[slots - first]
+
+def gap_mask(t_ms, gap_every_s, gap_s):
+    if not gap_every_s or not gap_s:
+        return np.ones(len(t_ms), dtype=bool)
+    return (t_ms % (gap_every_s * 1000)) >= gap_s * 1000
+
+def irtt_round_trips(rng, start_ns, duration_s, interval_ms, loss, burst):
+    n = int(duration_s * 1000 / interval_ms)
+    send_ns = start_ns + np.arange(n, dtype=np.int64) * interval_ms * 1_000_000 + rng.integers(0, 1_000_000, n)
+    t_ms = (send_ns - START_S * 1_000_000_000) // 1_000_000
+    uplink_ms = slot_levels(rng, t_ms, 20, 60) + rng.gamma(2.0, 2.0, n)
+    downlink_ms = slot_levels(rng, t_ms, 20, 60) + rng.gamma(2.0, 1.5, n)
+    if loss > 0:
+        bad_to_good = 1 / burst
+        good_to_bad = bad_to_good * loss / (1 - loss)
+        lost = generate_loss(rng, n, (good_to_bad, bad_to_good), np.ones(1)) > 0
+    else:
+        lost = np.zeros(n, dtype=bool)
+    direction = rng.choice(['true_down', 'true_up', 'true'], n, p=[0.6, 0.3, 0.1])
+    return send_ns, t_ms, uplink_ms, downlink_ms, lost, direction
+
+def irtt_json(send_ns, uplink_ms, downlink_ms, lost, direction):
+    round_trips = []
+    for i in range(len(send_ns)):
+        entry = {'timestamps': {'client': {'send': {'wall': int(send_ns[i])}}}}
+        if lost[i]:
+            entry['lost'] = str(direction[i])
+        else:
+            entry['lost'] = 'false'
+            entry['delay'] = {'send': int(uplink_ms[i] * 1e6), 'receive': int(downlink_ms[i] * 1e6)}
+        round_trips.append(entry)
+    return {'round_trips': round_trips}
+
+def iperf3_json(rng, start_s, duration_s):
+    # Bidirectional runs report most 100 ms intervals as zero and the whole
+    # second's bytes in one interval; fill_zeros_in_csv spreads them back.
+    n = int(duration_s / IPERF3_INTERVAL_S)
+    offsets = np.arange(n) * IPERF3_INTERVAL_S
+    t_ms = ((start_s - START_S) + offsets) * 1000
+    uplink = slot_levels(rng, t_ms.astype(np.int64), 5, 25) * rng.uniform(0.8, 1.2, n)
+    downlink = slot_levels(rng, t_ms.astype(np.int64), 30, 200) * rng.uniform(0.8, 1.2, n)
+    reported = np.arange(n) % 10 == 0
+    intervals = []
+    for i in range(n):
+        scale = 10e6 if reported[i] else 0.0
+        intervals.append({'streams': [
+            {'start': float(offsets[i]), 'end': float(offsets[i] + IPERF3_INTERVAL_S), 'bits_per_second': float(uplink[i] * scale), 'sender': True},
+            {'start': float(offsets[i]), 'end': float(offsets[i] + IPERF3_INTERVAL_S), 'bits_per_second': float(downlink[i] * scale), 'sender': False},
+        ]})
+    return {'start': {'timestamp': {'timesecs': start_s}}, 'intervals': intervals}
+
+def generate(output_dir, duration_s, interval_ms=10, loss=0.01, burst=3.0, gap_every_s=0, gap_s=0, file_s=600, seed=0):
+    rng = np.random.default_rng(seed)
+    irtt_dir = os.path.join(output_dir, 'irtt')
+    iperf3_dir = os.path.join(output_dir, 'iperf3')
+    os.makedirs(irtt_dir, exist_ok=True)
+    os.makedirs(iperf3_dir, exist_ok=True)
+
+    round_trips = 0
+    for file_start in range(0, int(duration_s), file_s):
+        length = min(file_s, duration_s - file_start)
+        start_s = START_S + file_start
+        send_ns, t_ms, uplink_ms, downlink_ms, lost, direction = irtt_round_trips(
+            rng, start_s * 1_000_000_000, length, interval_ms, loss, burst)
+        keep = gap_mask(t_ms, gap_every_s, gap_s)
+        with open(os.path.join(irtt_dir, f'irtt_{file_start:08d}.json'), 'w') as f:
+            json.dump(irtt_json(send_ns[keep], uplink_ms[keep], downlink_ms[keep], lost[keep], direction[keep]), f)
+        round_trips += int(keep.sum())
+
+        # A gap ends the iperf3 run; the next one starts when the gap is over.
+        data = iperf3_json(rng, start_s, length)
+        offsets_ms = (np.arange(len(data['intervals'])) * IPERF3_INTERVAL_S * 1000).astype(np.int64) + file_start * 1000
+        keep = gap_mask(offsets_ms, gap_every_s, gap_s)
+        data['intervals'] = [interval for interval, kept in zip(data['intervals'], keep) if kept]
+        with open(os.path.join(iperf3_dir, f'iperf3_{file_start:08d}.json'), 'w') as f:
+            json.dump(data, f)
+    return round_trips
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic irtt and iperf3 JSON captures for the processing scripts')
+    parser.add_argument('output_dir')
+    parser.add_argument('--duration_s', type=int, default=3600, help='Capture length in seconds')
+    parser.add_argument('--interval_ms', type=int, default=10, help='irtt send interval')
+    parser.add_argument('--loss', type=float, default=0.01, help='Fraction of lost round trips')
+    parser.add_argument('--burst', type=float, default=3.0, help='Mean length of a loss burst in round trips')
+    parser.add_argument('--gap_every_s', type=int, default=0, help='Drop a stretch of both captures every this many seconds')
+    parser.add_argument('--gap_s', type=int, default=0, help='Length of each dropped stretch in seconds')
+    parser.add_argument('--file_s', type=int, default=600, help='Seconds of capture per JSON file')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    round_trips = generate(args.output_dir, args.duration_s, args.interval_ms, args.loss, args.burst,
+                           args.gap_every_s, args.gap_s, args.file_s, args.seed)
+    print(f'Wrote {round_trips} irtt round trips and {args.duration_s} s of iperf3 intervals to {args.output_dir}')
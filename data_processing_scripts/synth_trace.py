@@ -0,0 +1,123 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+columns = ['uplink_throughput_Mbps', 'downlink_throughput_Mbps',
+           'uplink_delay_ms', 'downlink_delay_ms',
+           'uplink_packet_loss', 'downlink_packet_loss']
+level_columns = columns[:4]
+loss_columns = columns[4:]
+STEP_MS = 100
+SLOT_MS = 15000
+SLOT_ROWS = SLOT_MS // STEP_MS
+# Handover slots start at 12/27/42/57 s past the minute.
+SLOT_ALIGN_MS = 12000
+
+def slot_blocks(trace):
+    timestamps = trace['wall_time'].to_numpy()
+    first = int(np.argmax(timestamps % SLOT_MS == SLOT_ALIGN_MS % SLOT_MS))
+    n_slots = (len(trace) - first) // SLOT_ROWS
+    if n_slots < 2:
+        raise ValueError('The trace needs at least two complete 15 s handover slots.')
+    values = trace[columns].to_numpy(dtype=np.float64)[first:first + n_slots * SLOT_ROWS]
+    return values.reshape(n_slots, SLOT_ROWS, len(columns))
+
+def fit_loss(loss):
+    # Two-state Gilbert-Elliott model: rows with loss are the bad state.
+    bad = loss > 0
+    good_to_bad = np.count_nonzero(~bad[:-1] & bad[1:]) / max(1, np.count_nonzero(~bad[:-1]))
+    bad_to_good = np.count_nonzero(bad[:-1] & ~bad[1:]) / max(1, np.count_nonzero(bad[:-1]))
+    return good_to_bad, bad_to_good, loss[bad]
+
+def fit(trace):
+    blocks = slot_blocks(trace)
+    levels = blocks[:, :, :4].mean(axis=1)
+    residuals = blocks[:, :, :4] - levels[:, None, :]
+    model = {'levels': levels, 'residuals': residuals}
+    for idx, column in enumerate(loss_columns):
+        good_to_bad, bad_to_good, bad_values = fit_loss(blocks[:, :, 4 + idx].ravel())
+        model[f'{column}_transitions'] = np.array([good_to_bad, bad_to_good])
+        model[f'{column}_values'] = bad_values
+    return model
+
+def save_model(model, path):
+    np.savez_compressed(path, **model)
+
+def load_model(path):
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+def generate_loss(rng, rows, transitions, bad_values):
+    good_to_bad, bad_to_good = transitions
+    if good_to_bad == 0 or len(bad_values) == 0:
+        return np.zeros(rows)
+    # Alternating geometric run lengths give the state sequence without a
+    # per-row loop; enough runs are drawn to cover the requested rows.
+    mean_cycle = 1 / good_to_bad + 1 / max(bad_to_good, 1e-9)
+    n_cycles = int(rows / mean_cycle * 1.5) + 16
+    while True:
+        good_runs = rng.geometric(good_to_bad, n_cycles)
+        bad_runs = rng.geometric(max(bad_to_good, 1e-9), n_cycles)
+        if good_runs.sum() + bad_runs.sum() >= rows:
+            break
+        n_cycles *= 2
+    # Start in the good state at a random point of the first good run.
+    good_runs[0] = rng.integers(1, good_runs[0] + 1)
+    runs = np.column_stack([good_runs, bad_runs]).ravel()
+    states = np.repeat(np.tile([False, True], n_cycles), runs)[:rows]
+    loss = np.zeros(rows)
+    loss[states] = rng.choice(bad_values, np.count_nonzero(states))
+    return loss
+
+def generate(model, duration_s, seed=None):
+    rng = np.random.default_rng(seed)
+    rows = int(duration_s * 1000 // STEP_MS)
+    # Generation starts at -3 s so the slots line up with the handover
+    # schedule, then the rows before 0 are dropped.
+    lead_rows = (SLOT_MS - SLOT_ALIGN_MS) // STEP_MS
+    n_slots = -(-(rows + lead_rows) // SLOT_ROWS)
+    levels = model['levels']
+    residuals = model['residuals']
+
+    # Slot levels and within-slot shapes are bootstrapped independently, so
+    # a level seen in one slot is combined with the fluctuation of another.
+    level_idx = rng.integers(0, len(levels), n_slots)
+    residual_idx = rng.integers(0, len(residuals), n_slots)
+    values = levels[level_idx][:, None, :] + residuals[residual_idx]
+    values = np.maximum(values.reshape(-1, len(level_columns))[lead_rows:lead_rows + rows], 0)
+
+    trace = pd.DataFrame(values, columns=level_columns)
+    for column in loss_columns:
+        trace[column] = generate_loss(rng, rows, model[f'{column}_transitions'], model[f'{column}_values'])
+    trace['wall_time'] = np.arange(rows, dtype=np.int64) * STEP_MS
+    return trace
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fit a slot model to a processed trace and generate synthetic traces')
+    subparsers = parser.add_subparsers(dest='action', required=True)
+    fit_parser = subparsers.add_parser('fit', help='Save the slot model of a trace')
+    fit_parser.add_argument('trace_file')
+    fit_parser.add_argument('--model', required=True, help='Output .npz model')
+    generate_parser = subparsers.add_parser('generate', help='Write a synthetic trace in the emulator\'s 7-column format')
+    generate_parser.add_argument('source', help='Processed trace CSV or a .npz model from fit')
+    generate_parser.add_argument('--duration_h', type=float, default=24, help='Length of the synthetic trace in hours')
+    generate_parser.add_argument('--seed', type=int, default=None, help='Seed for reproducible traces')
+    generate_parser.add_argument('--output', required=True)
+    args = parser.parse_args()
+
+    if args.action == 'fit':
+        model = fit(pd.read_csv(args.trace_file, header=None, names=columns + ['wall_time']))
+        save_model(model, args.model)
+        print(f"Fitted {len(model['levels'])} slots of {args.trace_file} into {args.model}")
+    else:
+        if args.source.endswith('.npz'):
+            model = load_model(args.source)
+        else:
+            model = fit(pd.read_csv(args.source, header=None, names=columns + ['wall_time']))
+        start = time.perf_counter()
+        trace = generate(model, args.duration_h * 3600, args.seed)
+        elapsed = time.perf_counter() - start
+        print(f'Generated {len(trace)} rows in {elapsed:.2f} s ({len(trace) / elapsed / 1e6:.1f} M rows/s)')
+        trace[columns + ['wall_time']].to_csv(args.output, header=False, index=False, float_format='%.6f')
+        print(f'Wrote {args.output}')
@@ -0,0 +1,160 @@
+import json
+import zlib
+import struct
+import bisect
+import argparse
+import numpy as np
+import pandas as pd
+
+columns = ['uplink_throughput_Mbps', 'downlink_throughput_Mbps',
+           'uplink_delay_ms', 'downlink_delay_ms',
+           'uplink_packet_loss', 'downlink_packet_loss']
+all_columns = columns + ['wall_time']
+
+MAGIC = b'STARCH01'
+HEADER = struct.Struct('<8sQQ')
+# Final traces carry six decimals, so values are stored exactly as integers.
+SCALE = 1_000_000
+BLOCK_ROWS = 10 * 60 * 10
+STEP_MS = 100
+
+def encode_column(values, scale):
+    # Delta-encoded integers turn repeated throughput rows and the regular
+    # 100 ms wall_time into runs of identical bytes for zlib.
+    ints = np.rint(values * scale).astype('<i8')
+    deltas = np.diff(ints, prepend=np.int64(0))
+    return zlib.compress(deltas.tobytes(), 6)
+
+def decode_column(payload, scale):
+    ints = np.cumsum(np.frombuffer(zlib.decompress(payload), dtype='<i8'))
+    return ints if scale == 1 else ints / scale
+
+def read_blocks(csv_file, block_rows=BLOCK_ROWS):
+    for chunk in pd.read_csv(csv_file, header=None, names=all_columns, chunksize=block_rows):
+        yield chunk
+
+def pack(archive_file, sites, block_rows=BLOCK_ROWS):
+    index = {'version': 1, 'scale': SCALE, 'columns': all_columns, 'sites': {}}
+    with open(archive_file, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, 0, 0))
+        for site, csv_file in sites:
+            blocks = []
+            rows = 0
+            for chunk in read_blocks(csv_file, block_rows):
+                lengths = []
+                offset = f.tell()
+                for column in all_columns:
+                    payload = encode_column(chunk[column].to_numpy(), 1 if column == 'wall_time' else SCALE)
+                    f.write(payload)
+                    lengths.append(len(payload))
+                wall_time = chunk['wall_time']
+                blocks.append([int(wall_time.iloc[0]), int(wall_time.iloc[-1]), len(chunk), offset, lengths])
+                rows += len(chunk)
+            if not blocks:
+                raise ValueError(f'{csv_file} holds no rows.')
+            if any(blocks[i][0] <= blocks[i - 1][1] for i in range(1, len(blocks))):
+                raise ValueError(f'{csv_file} is not sorted by wall_time.')
+            index['sites'][site] = {'source': csv_file, 'rows': rows, 'blocks': blocks}
+            print(f'Packed {rows} rows of {csv_file} as {site} in {len(blocks)} blocks')
+        index_offset = f.tell()
+        payload = zlib.compress(json.dumps(index).encode(), 9)
+        f.write(payload)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, index_offset, len(payload)))
+
+class TraceArchive:
+    def __init__(self, archive_file):
+        self.archive_file = archive_file
+        self.file = open(archive_file, 'rb')
+        magic, index_offset, index_size = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f'{archive_file} is not a trace archive.')
+        self.file.seek(index_offset)
+        self.index = json.loads(zlib.decompress(self.file.read(index_size)))
+        self.sites = self.index['sites']
+        self.block_starts = {site: [block[0] for block in info['blocks']] for site, info in self.sites.items()}
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def time_range(self, site):
+        blocks = self.sites[site]['blocks']
+        return blocks[0][0], blocks[-1][1] + STEP_MS
+
+    def decode_block(self, block, wanted):
+        _, _, _, offset, lengths = block
+        self.file.seek(offset)
+        raw = self.file.read(sum(lengths))
+        decoded = {}
+        position = 0
+        for column, length in zip(all_columns, lengths):
+            if column in wanted:
+                decoded[column] = decode_column(raw[position:position + length], 1 if column == 'wall_time' else self.index['scale'])
+            position += length
+        return decoded
+
+    def read_window(self, site, start_ms=None, end_ms=None, wanted=None):
+        # Only blocks overlapping [start_ms, end_ms) are read and inflated.
+        if site not in self.sites:
+            raise KeyError(f'No site {site!r} in {self.archive_file}; choose from {sorted(self.sites)}.')
+        first_ms, last_ms = self.time_range(site)
+        start_ms = first_ms if start_ms is None else start_ms
+        end_ms = last_ms if end_ms is None else end_ms
+        wanted = all_columns if wanted is None else list(wanted)
+        decode = set(wanted) | {'wall_time'}
+        blocks = self.sites[site]['blocks']
+        first = max(bisect.bisect_right(self.block_starts[site], start_ms) - 1, 0)
+        parts = []
+        for block in blocks[first:]:
+            if block[0] >= end_ms:
+                break
+            if block[1] < start_ms:
+                continue
+            parts.append(self.decode_block(block, decode))
+        if not parts:
+            return pd.DataFrame(columns=wanted)
+        data = {column: np.concatenate([part[column] for part in parts]) for column in decode}
+        mask = (data['wall_time'] >= start_ms) & (data['wall_time'] < end_ms)
+        return pd.DataFrame({column: data[column][mask] for column in wanted})
+
+def read_window(archive_file, site, start_ms=None, end_ms=None, wanted=None):
+    with TraceArchive(archive_file) as archive:
+        return archive.read_window(site, start_ms, end_ms, wanted)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pack final traces into a compressed archive and read windows back')
+    subparsers = parser.add_subparsers(dest='action', required=True)
+    pack_parser = subparsers.add_parser('pack', help='Write a new archive from one or more final trace CSVs')
+    pack_parser.add_argument('archive_file')
+    pack_parser.add_argument('--site', nargs=2, action='append', required=True, metavar=('NAME', 'CSV'), help='Site name and its trace; repeat for each site')
+    pack_parser.add_argument('--block_rows', type=int, default=BLOCK_ROWS, help='Rows per compressed block (default 10 minutes)')
+    list_parser = subparsers.add_parser('list', help='Show the sites and time ranges in an archive')
+    list_parser.add_argument('archive_file')
+    extract_parser = subparsers.add_parser('extract', help='Write a window of one site back out as a trace CSV')
+    extract_parser.add_argument('archive_file')
+    extract_parser.add_argument('site')
+    extract_parser.add_argument('--start_ms', type=int, default=None, help='First wall_time to include (default: start of the site)')
+    extract_parser.add_argument('--duration_s', type=float, default=None, help='Window length in seconds (default: to the end of the site)')
+    extract_parser.add_argument('--output', required=True)
+    args = parser.parse_args()
+
+    if args.action == 'pack':
+        pack(args.archive_file, args.site, args.block_rows)
+    elif args.action == 'list':
+        with TraceArchive(args.archive_file) as archive:
+            for site, info in archive.sites.items():
+                first_ms, last_ms = archive.time_range(site)
+                print(f"{site}: {info['rows']} rows in {len(info['blocks'])} blocks, wall_time {first_ms} to {last_ms} ms, from {info['source']}")
+    else:
+        with TraceArchive(args.archive_file) as archive:
+            start_ms = args.start_ms if args.start_ms is not None else archive.time_range(args.site)[0]
+            end_ms = start_ms + int(args.duration_s * 1000) if args.duration_s is not None else None
+            df = archive.read_window(args.site, start_ms, end_ms)
+        df.to_csv(args.output, header=False, index=False)
+        print(f'Wrote {len(df)} rows to {args.output}')
@@ -0,0 +1,140 @@
+import os
+import re
+import operator
+import argparse
+import numpy as np
+import pandas as pd
+
+columns = ['uplink_throughput_Mbps', 'downlink_throughput_Mbps',
+           'uplink_delay_ms', 'downlink_delay_ms',
+           'uplink_packet_loss', 'downlink_packet_loss']
+stats = ['min', 'max', 'mean', 'p5', 'p50', 'p95', 'max_step']
+STEP_MS = 100
+
+# Window length in seconds -> alignment of the first window in ms. 15 s
+# windows follow the handover slots starting at 12/27/42/57 s.
+resolutions = {1: 0, 15: 12000, 60: 0}
+
+operators = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+}
+
+def index_path(trace_file):
+    return f'{trace_file}.index.npz'
+
+def window_stats(values, timestamps, window_s, align_ms):
+    rows = window_s * 1000 // STEP_MS
+    aligned = (timestamps - align_ms) % (window_s * 1000) == 0
+    first = np.argmax(aligned)
+    n_windows = (len(values) - first) // rows if aligned.any() else 0
+    if n_windows == 0:
+        return np.empty(0, dtype=timestamps.dtype), np.empty((0, values.shape[1], len(stats)))
+    block = values[first:first + n_windows * rows].reshape(n_windows, rows, values.shape[1])
+    starts = timestamps[first:first + n_windows * rows:rows]
+
+    steps = np.abs(np.diff(values[max(first - 1, 0):first + n_windows * rows], axis=0))
+    if first == 0:
+        steps = np.vstack([np.zeros((1, values.shape[1])), steps])
+    steps = steps.reshape(n_windows, rows, values.shape[1])
+
+    p5, p50, p95 = np.percentile(block, [5, 50, 95], axis=1)
+    summary = np.stack([
+        block.min(axis=1), block.max(axis=1), block.mean(axis=1),
+        p5, p50, p95, steps.max(axis=1)
+    ], axis=2)
+    return starts, summary
+
+def build_index(trace_file):
+    df = pd.read_csv(trace_file, header=None, names=columns + ['wall_time'])
+    values = df[columns].to_numpy(dtype=np.float64)
+    timestamps = df['wall_time'].to_numpy(dtype=np.int64)
+    stat = os.stat(trace_file)
+    arrays = {
+        'source_size': np.int64(stat.st_size),
+        'source_mtime': np.int64(stat.st_mtime_ns),
+    }
+    for window_s, align_ms in resolutions.items():
+        starts, summary = window_stats(values, timestamps, window_s, align_ms)
+        arrays[f'starts_{window_s}'] = starts
+        arrays[f'summary_{window_s}'] = summary.astype(np.float32)
+    np.savez(index_path(trace_file), **arrays)
+    print(f'Indexed {len(df)} rows of {trace_file} into {index_path(trace_file)}')
+
+class TraceIndex:
+    def __init__(self, trace_file):
+        path = index_path(trace_file)
+        stat = os.stat(trace_file)
+        if os.path.exists(path):
+            with np.load(path) as data:
+                fresh = data['source_size'] == stat.st_size and data['source_mtime'] == stat.st_mtime_ns
+        else:
+            fresh = False
+        if not fresh:
+            build_index(trace_file)
+        with np.load(path) as data:
+            self.starts = {window_s: data[f'starts_{window_s}'] for window_s in resolutions}
+            self.summary = {window_s: data[f'summary_{window_s}'] for window_s in resolutions}
+
+    def query(self, window_s, conditions):
+        if window_s not in resolutions:
+            raise ValueError(f'No {window_s} s resolution in the index; choose from {sorted(resolutions)}.')
+        return self.starts[window_s][matching(self.summary[window_s], conditions)]
+
+def matching(summary, conditions):
+    mask = np.ones(len(summary), dtype=bool)
+    for column, stat, op, value in conditions:
+        mask &= operators[op](summary[:, columns.index(column), stats.index(stat)], value)
+    return mask
+
+def parse_condition(text):
+    # e.g. "downlink_packet_loss.mean>0.05" or "downlink_delay_ms.max_step >= 30"
+    match = re.fullmatch(r'\s*(\w+)(?:\.(\w+))?\s*(<=|>=|==|<|>)\s*([-+\d.eE]+)\s*', text)
+    if match is None:
+        raise ValueError(f'Cannot parse condition {text!r}; expected column[.stat] op value.')
+    column, stat, op, value = match.groups()
+    stat = stat or 'mean'
+    if column not in columns:
+        raise ValueError(f'Unknown column {column!r}; choose from {columns}.')
+    if stat not in stats:
+        raise ValueError(f'Unknown statistic {stat!r}; choose from {stats}.')
+    return column, stat, op, float(value)
+
+def find_segments(trace_file, window_s, condition_texts):
+    conditions = [parse_condition(text) for text in condition_texts]
+    return TraceIndex(trace_file).query(window_s, conditions)
+
+def find_segments_in(df, window_s, condition_texts):
+    # Same query over trace rows already in memory, such as an archive
+    # window, summarised on the fly instead of from an index file.
+    if window_s not in resolutions:
+        raise ValueError(f'No {window_s} s resolution in the index; choose from {sorted(resolutions)}.')
+    conditions = [parse_condition(text) for text in condition_texts]
+    values = df.iloc[:, :len(columns)].to_numpy(dtype=np.float64)
+    timestamps = df.iloc[:, len(columns)].to_numpy(dtype=np.int64)
+    starts, summary = window_stats(values, timestamps, window_s, resolutions[window_s])
+    return starts[matching(summary, conditions)]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build and query window summaries of a trace')
+    subparsers = parser.add_subparsers(dest='action', required=True)
+    build_parser = subparsers.add_parser('build', help='Build the index next to each trace')
+    build_parser.add_argument('trace_files', nargs='+')
+    query_parser = subparsers.add_parser('query', help='Print --start_time offsets of windows matching every condition')
+    query_parser.add_argument('trace_file')
+    query_parser.add_argument('--window', type=int, default=15, choices=sorted(resolutions), help='Window length in seconds')
+    query_parser.add_argument('--where', nargs='+', required=True, help='Conditions such as "downlink_packet_loss.mean>0.05"')
+    query_parser.add_argument('--limit', type=int, default=20, help='Print at most this many offsets (0 for all)')
+    args = parser.parse_args()
+
+    if args.action == 'build':
+        for trace_file in args.trace_files:
+            build_index(trace_file)
+    else:
+        starts = find_segments(args.trace_file, args.window, args.where)
+        print(f'{len(starts)} matching {args.window} s windows')
+        for start in starts[:args.limit or None]:
+            print(start)
@@ -1,37 +1,50 @@
+import os
 import time
-import csv
 import threading
 import argparse
-from mininet.link import TCLink
+from array import array
+from mininet.link import Link, TCLink
 from mininet.log import setLogLevel
 from mininet.net import Mininet
 from multiprocessing import Process, Value
 from mininet.cli import CLI
-
-iface1 = "r2-eth0"
-init_flags = {
-    'r3-eth1': False,
-    'r5-eth0': False,
-    'r2-eth1': False,
-    'r4-eth0': False
-}
-
-barrier = threading.Barrier(4)
+from mininet.node import OVSBridge
+from link_control import HandoverStager, LinkTrace, batch_command, load_jitter, load_trace, set_shaping_mode, shaping_commands, use_trace
+from async_engine import run_async_engine
+from process_engine import run_process_engine
+from trace_shm import attach_trace
+from run_log import RunLog
+from measurement_harness import PROFILES, client_ip, run_profiles
+import profiling
+
+init_flags = {}
+
+barrier = None
 update_event = threading.Event()
 start_event = threading.Event()
-timestamp_5g = Value('i', 0)
-timestamp_starlink = Value('i', 0)
+start_lock = threading.Lock()
+test_started = False
+timestamp_5g = Value('q', 0)
+timestamp_starlink = Value('q', 0)
 
 start_time_option = None
 start_time_offset = 0
+prestage_handovers = True
+run_log_dir = None
+test_profiles = []
+test_output = './runs'
+clients = 0
+tick_wall_ms = None
+tick_lateness_ms = []
+TICK_REPORT_INTERVAL = 600
 
 def auto_test():
-    # your test code
-    pass
+    if test_profiles:
+        run_profiles(net, prefix, subnet, test_profiles, test_output, clients)
 
 class NetworkConfigThread(threading.Thread):
     def __init__(self, net, host_name, dev, column, barrier, timestamp, update_event, data_file):
-        super().__init__()
+        super().__init__(name=dev)
         self.net = net
         self.host_name = host_name
         self.column = column
@@ -40,23 +53,7 @@ class NetworkConfigThread(threading.Thread):
         self.timestamp = timestamp
         self.update_event = update_event
         self.data_file = data_file
-        self.latency_lines = self.read_csv_data()
-        self.timestamp_to_line = self.create_timestamp_index()
-        self.timestamps = sorted([int(line[-1]) for line in self.latency_lines])
-        self.total_duration = self.timestamps[-1] - self.timestamps[0] + 100
-
-    def read_csv_data(self):
-        with open(self.data_file, 'r') as file:
-            reader = csv.reader(file)
-            latency_lines = [line for line in reader if line]
-        return latency_lines
-
-    def create_timestamp_index(self):
-        timestamp_index = {}
-        for idx, line in enumerate(self.latency_lines):
-            timestamp = int(line[-1])
-            timestamp_index[timestamp] = idx
-        return timestamp_index
+        self.trace = load_trace(data_file)
 
     def run(self):
         configureNetworkConditions(self)
@@ -71,43 +68,46 @@ def configureNetworkConditions(thread_obj):
     column = thread_obj.column
     barrier = thread_obj.barrier
     update_event = thread_obj.update_event
-    latency_lines = thread_obj.latency_lines
-    timestamp_to_line = thread_obj.timestamp_to_line
+    trace = thread_obj.trace
     data_file = thread_obj.data_file
     timestamp = thread_obj.timestamp
 
     host = net.get(host_name)
     
-    if not init_flags[dev]:
-        init_flags[dev] = True
-        check_and_start_test()
+    with start_lock:
+        if not init_flags[dev]:
+            init_flags[dev] = True
+            check_and_start_test()
 
     start_event.wait()
 
     current_timestamp = get_current_virtual_timestamp(start_time_offset)
-    line_num = find_line_number(timestamp_to_line, current_timestamp)
+    line_num = trace.find_line_number(current_timestamp)
 
     if line_num is None:
-        line_num = synchronize_timestamp(timestamp_to_line, current_timestamp)
+        line_num = trace.closest_line_number(current_timestamp)
         if line_num is None:
             print(f"No matching timestamp found in {data_file}. Exiting thread.")
             return
 
-    if '5G' in data_file:
-        loss_rate = '1%'
-    else:
-        current_packet_loss = float(latency_lines[line_num][column + 2]) * 100
-        loss_rate = f'{current_packet_loss}%'
+    run_log = RunLog(os.path.join(run_log_dir, f'{dev}.bin'), [dev]) if run_log_dir else None
 
-    initialBW = float(latency_lines[line_num][column - 2])
-    cmd_bw = f'tc qdisc replace dev {dev} root handle 1: tbf rate {initialBW}mbit burst 15k latency 50ms'
-    host.cmd(cmd_bw)
+    initialBW, initialDelay, loss, jitter = trace.link_params(line_num, column)
+    cmd_start_ns = time.perf_counter_ns()
+    for cmd in shaping_commands(dev, initialBW, initialDelay, loss, jitter, initial=True):
+        host.cmd(cmd)
+    if run_log is not None:
+        run_log.append(0, time.time_ns(), current_timestamp, initialBW, initialDelay, loss, time.perf_counter_ns() - cmd_start_ns)
 
-    initialDelay = float(latency_lines[line_num][column])
-    cmd_jitter = f'tc qdisc add dev {dev} parent 1:1 handle 10: netem delay {initialDelay}ms loss {loss_rate}'
-    host.cmd(cmd_jitter)
+    handover_steps = trace.find_handover_steps(column) if prestage_handovers else set()
+    stager = HandoverStager(dev)
+    staged_line = None
+    cmd_lock = threading.Lock()
+    timers = profiling.thread_timers(dev)
     
     barrier.wait()
+    # Every link has its initial qdisc once the first barrier is passed.
+    start_test_once()
 
     while True:
         update_event.wait()
@@ -133,28 +133,60 @@ def configureNetworkConditions(thread_obj):
             
             virtual_timestamp = timestamp.value
 
-        effective_timestamp = ((virtual_timestamp - thread_obj.timestamps[0]) % thread_obj.total_duration) + thread_obj.timestamps[0]
-        line_num = find_line_number(thread_obj.timestamp_to_line, effective_timestamp)
+        if timers:
+            start_ns = time.perf_counter_ns()
+        effective_timestamp = trace.effective_timestamp(virtual_timestamp)
+        line_num = trace.find_line_number(effective_timestamp)
+        if timers:
+            timers.add('trace_lookup', start_ns)
         if line_num is None:
             print(f"[{data_file}] Virtual timestamp {virtual_timestamp} ms not found in data file.")
             continue
 
-        currentBW = float(latency_lines[line_num][column - 2])
-        update_cmd_bw = f'tc qdisc change dev {dev} root handle 1: tbf rate {currentBW}mbit burst 15k latency 50ms'
-        host.cmd(update_cmd_bw)
-
-        currentDelay = float(latency_lines[line_num][column])
-
-        if '5G' in data_file:
-            loss_rate = '1%'
-        else:
-            current_packet_loss = float(latency_lines[line_num][column + 2]) * 100
-            loss_rate = f'{current_packet_loss}%'
-        
-        update_cmd = f'tc qdisc change dev {dev} parent 1:1 handle 10: netem delay {currentDelay}ms loss {loss_rate}'
-        host.cmd(update_cmd)
-
+        if line_num != staged_line:
+            if timers:
+                start_ns = time.perf_counter_ns()
+            currentBW, currentDelay, loss, jitter = trace.link_params(line_num, column)
+            cmds = shaping_commands(dev, currentBW, currentDelay, loss, jitter)
+            if timers:
+                timers.add('command_build', start_ns)
+            with cmd_lock:
+                cmd_start_ns = time.perf_counter_ns()
+                for cmd in cmds:
+                    host.cmd(cmd)
+                if timers:
+                    timers.add('host_cmd', cmd_start_ns)
+                if run_log is not None:
+                    run_log.append(0, time.time_ns(), virtual_timestamp, currentBW, currentDelay, loss, time.perf_counter_ns() - cmd_start_ns)
+        staged_line = None
+
+        next_line = trace.find_line_number(trace.effective_timestamp(virtual_timestamp + 100))
+        if next_line in handover_steps:
+            boundary_ms = (current_wall_time_ms // 100 + 1) * 100
+            staged_line = next_line
+            stage_timer = threading.Timer(
+                max(0, stager.issue_time_ms(boundary_ms) - time.time() * 1000) / 1000,
+                apply_staged_handover,
+                args=(host, dev, cmd_lock, stager, run_log, virtual_timestamp + 100, boundary_ms, trace.link_params(next_line, column))
+            )
+            stage_timer.start()
+
+        if timers:
+            start_ns = time.perf_counter_ns()
         barrier.wait()
+        if timers:
+            timers.add('barrier_wait', start_ns)
+
+def apply_staged_handover(host, dev, cmd_lock, stager, run_log, virtual_timestamp, boundary_ms, params):
+    bw, delay, loss, jitter = params
+    with cmd_lock:
+        issued_ms = time.time() * 1000
+        cmd_start_ns = time.perf_counter_ns()
+        host.cmd(batch_command(shaping_commands(dev, bw, delay, loss, jitter)))
+        completed_ms = time.time() * 1000
+        if run_log is not None:
+            run_log.append(0, time.time_ns(), virtual_timestamp, bw, delay, loss, time.perf_counter_ns() - cmd_start_ns)
+    stager.record(virtual_timestamp, boundary_ms, issued_ms, completed_ms)
 
 def get_current_virtual_timestamp(start_time_offset):
     current_wall_time_ms = int(time.time() * 1000)
@@ -163,18 +195,6 @@ def get_current_virtual_timestamp(start_time_offset):
     virtual_timestamp = (virtual_timestamp // 100) * 100
     return virtual_timestamp
 
-def find_line_number(timestamp_to_line, timestamp):
-    if timestamp in timestamp_to_line:
-        return timestamp_to_line[timestamp]
-    else:
-        return None
-
-def synchronize_timestamp(timestamp_to_line, current_timestamp):
-    timestamps = sorted(timestamp_to_line.keys())
-    timestamp_idx = min(range(len(timestamps)), key=lambda i: abs(timestamps[i] - current_timestamp))
-    closest_timestamp = timestamps[timestamp_idx]
-    return timestamp_to_line[closest_timestamp]
-
 def check_and_start_test():
     global start_time_offset
     global start_event
@@ -188,15 +208,38 @@ def check_and_start_test():
         else:
             start_time_offset = 0
             print("No start_time_option specified, synchronizing with wall time.")
+        start_wall_ms = (int(time.time() * 1000) // 100) * 100
+        start_virtual = args.start_time if args.start_time is not None else start_wall_ms % (60 * 1000)
+        print(f"Virtual time starts at {start_virtual} ms at wall time {start_wall_ms} ms")
 
         start_event.set()
 
-        test_process = Process(target=auto_test)
-        test_process.start()
+def start_test_once():
+    global test_started
+    with start_lock:
+        if test_started:
+            return
+        test_started = True
+    test_process = Process(target=auto_test)
+    test_process.start()
+
+def record_tick_completion():
+    # Runs as the barrier action, once every controller thread has applied
+    # the tick, so the lateness covers the whole shaping loop.
+    if tick_wall_ms is None:
+        return
+    tick_lateness_ms.append(time.time() * 1000 - tick_wall_ms)
+    if len(tick_lateness_ms) == TICK_REPORT_INTERVAL:
+        lateness = sorted(tick_lateness_ms)
+        tick_lateness_ms.clear()
+        print(f"[update] {len(net.hosts)} hosts, last {len(lateness)} ticks done after the boundary: "
+              f"mean {sum(lateness) / len(lateness):.1f} ms, p50 {lateness[len(lateness) // 2]:.1f} ms, "
+              f"p99 {lateness[int(len(lateness) * 0.99)]:.1f} ms, max {lateness[-1]:.1f} ms")
 
 def update_lines_based_on_wall_time(update_event):
     global start_time_offset
     global start_event
+    global tick_wall_ms
     
     start_event.wait()
     next_update_time = ((int(time.time() * 1000) // 100) + 1) * 100
@@ -208,6 +251,7 @@ def update_lines_based_on_wall_time(update_event):
             if last_update_time is None or current_time_ms - last_update_time >= 100:
                 timestamp_5g.value += 100
                 timestamp_starlink.value += 100
+                tick_wall_ms = next_update_time
                 update_event.set()
                 last_update_time = current_time_ms
                 next_update_time = ((current_time_ms // 100) + 1) * 100
@@ -220,6 +264,25 @@ def update_lines_based_on_wall_time(update_event):
 if '__main__' == __name__:
     parser = argparse.ArgumentParser(description='Network Emulator')
     parser.add_argument('--start_time', type=int, default=None, help='Starting timestamp in milliseconds (e.g., --start_time=23100)')
+    parser.add_argument('--segment', nargs='+', default=None, help='Start at a Starlink trace window matching every condition, e.g. --segment "downlink_packet_loss.mean>0.05" (see data_processing_scripts/trace_index.py)')
+    parser.add_argument('--segment_window', type=int, default=15, help='Window length in seconds for --segment')
+    parser.add_argument('--segment_pick', type=int, default=0, help='Which matching window to start at')
+    parser.add_argument('--archive', default=None, help='Read traces from an archive written by data_processing_scripts/trace_archive.py instead of the CSV files')
+    parser.add_argument('--archive_site', nargs=2, action='append', default=[], metavar=('PATH', 'SITE'), help='Archive site to replay on a path (Starlink or 5G); repeat for each path')
+    parser.add_argument('--archive_window', type=int, nargs=2, default=None, metavar=('START_MS', 'DURATION_S'), help='Decode and loop only this window of each archive site')
+    parser.add_argument('--engine', choices=['thread', 'async', 'process'], default='thread', help='Link controller engine: one thread per link, a single asyncio event loop, or one worker process per router namespace')
+    parser.add_argument('--instance', type=int, default=0, help='Instance number for running several emulators side by side; scopes node names and uses the 10.<instance>.0.0/16 address space')
+    parser.add_argument('--shared_traces', action='store_true', help='Map traces published with trace_shm.py read-only instead of parsing them per instance')
+    parser.add_argument('--shaping', choices=['tbf', 'netem'], default='tbf', help='Shape each link with a tbf root and netem child, or with a single netem qdisc using its rate option')
+    parser.add_argument('--jitter', action='store_true', help='Apply per-interval netem jitter from the <trace>.jitter.csv tables written by data_process.py (requires --shaping=netem)')
+    parser.add_argument('--no_prestage', action='store_true', help='Apply handover steps on the tick like every other update instead of staging them to land on the boundary')
+    parser.add_argument('--run_log', default=None, help='Directory for binary logs of every applied link update (read them with run_log.py)')
+    parser.add_argument('--clients', type=int, default=0, help='Attach this many client hosts c1..cN to the Starlink segment behind the shaped link')
+    parser.add_argument('--test_profiles', nargs='+', choices=sorted(PROFILES), default=[], help='Measurement profiles to run back to back once emulation starts')
+    parser.add_argument('--test_output', default='./runs', help='Directory for per-run iperf3 and irtt results')
+    parser.add_argument('--profile', default=None, metavar='DIR', help='Enable profiling hooks: SIGUSR1 samples every thread into DIR, SIGUSR2 prints the per-link scoped timers')
+    parser.add_argument('--profile_duration', type=float, default=10.0, help='Seconds each SIGUSR1 sampling run lasts')
+    parser.add_argument('--deadline_ms', type=int, default=80, help='Per-tick deadline for applying link updates in the async and process engines')
     args = parser.parse_args()
 
     data_files = {
@@ -227,15 +290,77 @@ if '__main__' == __name__:
         'Starlink': './lagos.csv'
     }
 
-    with open(data_files['5G'], 'r') as file:
-        reader = csv.reader(file)
-        latency_lines_5g = [line for line in reader if line]
-    timestamp_index_5g = {int(line[-1]) for line in latency_lines_5g}
-
-    with open(data_files['Starlink'], 'r') as file:
-        reader = csv.reader(file)
-        latency_lines_starlink = [line for line in reader if line]
-    timestamp_index_starlink = {int(line[-1]) for line in latency_lines_starlink}
+    if not 0 <= args.instance <= 255:
+        print(f"Error: The instance number {args.instance} must be between 0 and 255.")
+        exit(1)
+    prestage_handovers = not args.no_prestage
+    if args.profile:
+        profiling.enable(args.profile, args.profile_duration)
+    set_shaping_mode(args.shaping)
+    test_profiles = args.test_profiles
+    test_output = args.test_output
+    clients = args.clients
+    if not 0 <= clients <= 240:
+        print(f"Error: The number of clients {clients} must be between 0 and 240.")
+        exit(1)
+    if args.run_log:
+        run_log_dir = args.run_log
+        os.makedirs(run_log_dir, exist_ok=True)
+    prefix = f'i{args.instance}' if args.instance else ''
+    subnet = f'10.{args.instance}'
+
+    archive_frames = {}
+    if args.archive:
+        from data_processing_scripts.trace_archive import TraceArchive
+        with TraceArchive(args.archive) as archive:
+            for path, site in args.archive_site:
+                if path not in data_files:
+                    print(f"Error: Unknown path {path}; choose from {', '.join(data_files)}.")
+                    exit(1)
+                if args.archive_window:
+                    window_start, window_s = args.archive_window
+                    df = archive.read_window(site, window_start, window_start + window_s * 1000)
+                else:
+                    df = archive.read_window(site)
+                if df.empty:
+                    print(f"Error: No rows for site {site} in the requested window of {args.archive}.")
+                    exit(1)
+                data = array('d')
+                data.frombytes(df.to_numpy(dtype='float64').tobytes())
+                use_trace(data_files[path], LinkTrace(data_files[path], data))
+                archive_frames[path] = df
+                print(f"Replaying {len(df)} rows of archive site {site} on the {path} path")
+
+    if args.shared_traces:
+        for data_file in data_files.values():
+            attach_trace(data_file, args.jitter)
+
+    if args.jitter:
+        if args.shaping != 'netem':
+            print("Error: --jitter needs --shaping=netem; without netem's own rate, jittered packets leave netem out of order and bulk TCP collapses.")
+            exit(1)
+        if args.archive:
+            print("Error: --jitter reads the tables next to the CSV traces and cannot be combined with --archive.")
+            exit(1)
+        if not args.shared_traces:
+            for data_file in data_files.values():
+                load_jitter(data_file)
+
+    if args.segment:
+        from data_processing_scripts.trace_index import find_segments, find_segments_in
+        # Search the Starlink trace that is actually replayed: an archive site
+        # replaces ./lagos.csv and is summarised from the decoded rows.
+        if 'Starlink' in archive_frames:
+            segments = find_segments_in(archive_frames['Starlink'], args.segment_window, args.segment)
+            segment_source = "the Starlink archive site"
+        else:
+            segments = find_segments(data_files['Starlink'], args.segment_window, args.segment)
+            segment_source = data_files['Starlink']
+        if args.segment_pick >= len(segments):
+            print(f"Error: Only {len(segments)} windows in {segment_source} match {' and '.join(args.segment)}.")
+            exit(1)
+        args.start_time = int(segments[args.segment_pick])
+        print(f"Starting at segment {args.segment_pick} of {len(segments)} matching windows: --start_time={args.start_time}")
 
     if args.start_time is not None:
         start_time_option = args.start_time
@@ -251,121 +376,151 @@ if '__main__' == __name__:
     setLogLevel('info')
     net = Mininet(link=TCLink)
 
-    h1 = net.addHost('h1')
-    h2 = net.addHost('h2')
-    r1 = net.addHost('r1')
-    r2 = net.addHost('r2')
-    r3 = net.addHost('r3')
-    r4 = net.addHost('r4')
-    r5 = net.addHost('r5')
+    h1 = net.addHost(f'{prefix}h1')
+    h2 = net.addHost(f'{prefix}h2')
+    r1 = net.addHost(f'{prefix}r1')
+    r2 = net.addHost(f'{prefix}r2')
+    r3 = net.addHost(f'{prefix}r3')
+    r4 = net.addHost(f'{prefix}r4')
+    r5 = net.addHost(f'{prefix}r5')
+    client_hosts = [net.addHost(f'{prefix}c{i}') for i in range(1, clients + 1)]
 
     net.addLink(r1, h1, cls=TCLink)
     net.addLink(r1, r4, cls=TCLink)
     net.addLink(r1, r5, cls=TCLink)
     net.addLink(r4, r2, cls=TCLink)
     net.addLink(r5, r3, cls=TCLink)
-    net.addLink(r2, h2, cls=TCLink)
+    if clients:
+        # The bridge keeps r2-eth1 as the single shaped downlink for h2 and
+        # every client, so they contend for one emulated terminal.
+        s1 = net.addSwitch(f'{prefix}s1', cls=OVSBridge)
+        net.addLink(r2, s1, cls=TCLink)
+        net.addLink(s1, h2, cls=TCLink)
+    else:
+        net.addLink(r2, h2, cls=TCLink)
     net.addLink(r3, h2, cls=TCLink)
+    # Client links are never shaped, so plain veth pairs skip the tc setup
+    # TCLink runs on both ends of every one.
+    for client in client_hosts:
+        net.addLink(s1, client, cls=Link)
     net.build()
+    if clients:
+        s1.start([])
 
-    r1.cmd("ifconfig r1-eth0 0")
-    r1.cmd("ifconfig r1-eth1 0")
-    r1.cmd("ifconfig r1-eth2 0")
+    r1.cmd(f"ifconfig {prefix}r1-eth0 0")
+    r1.cmd(f"ifconfig {prefix}r1-eth1 0")
+    r1.cmd(f"ifconfig {prefix}r1-eth2 0")
 
     r1.cmd("echo 1 > /proc/sys/net/ipv4/ip_forward")
     r1.cmd("echo 1 > /proc/sys/net/ipv4/conf/all/proxy_arp")
 
-    r1.cmd("ifconfig r1-eth0 10.0.1.1 netmask 255.255.255.0")
-    r1.cmd("ifconfig r1-eth1 10.0.2.1 netmask 255.255.255.0")
-    r1.cmd("ifconfig r1-eth2 10.0.3.1 netmask 255.255.255.0")
+    r1.cmd(f"ifconfig {prefix}r1-eth0 {subnet}.1.1 netmask 255.255.255.0")
+    r1.cmd(f"ifconfig {prefix}r1-eth1 {subnet}.2.1 netmask 255.255.255.0")
+    r1.cmd(f"ifconfig {prefix}r1-eth2 {subnet}.3.1 netmask 255.255.255.0")
 
-    r4.cmd("ifconfig r4-eth0 0")
-    r4.cmd("ifconfig r4-eth1 0")
+    r4.cmd(f"ifconfig {prefix}r4-eth0 0")
+    r4.cmd(f"ifconfig {prefix}r4-eth1 0")
 
     r4.cmd("echo 1 > /proc/sys/net/ipv4/ip_forward")
     r4.cmd("echo 1 > /proc/sys/net/ipv4/conf/all/proxy_arp")
 
-    r4.cmd("ifconfig r4-eth0 10.0.2.4 netmask 255.255.255.0")
-    r4.cmd("ifconfig r4-eth1 10.0.6.4 netmask 255.255.255.0")
+    r4.cmd(f"ifconfig {prefix}r4-eth0 {subnet}.2.4 netmask 255.255.255.0")
+    r4.cmd(f"ifconfig {prefix}r4-eth1 {subnet}.6.4 netmask 255.255.255.0")
 
-    r5.cmd("ifconfig r5-eth0 0")
-    r5.cmd("ifconfig r5-eth1 0")
+    r5.cmd(f"ifconfig {prefix}r5-eth0 0")
+    r5.cmd(f"ifconfig {prefix}r5-eth1 0")
 
     r5.cmd("echo 1 > /proc/sys/net/ipv4/ip_forward")
     r5.cmd("echo 1 > /proc/sys/net/ipv4/conf/all/proxy_arp")
 
-    r5.cmd("ifconfig r5-eth0 10.0.3.4 netmask 255.255.255.0")
-    r5.cmd("ifconfig r5-eth1 10.0.7.4 netmask 255.255.255.0")
+    r5.cmd(f"ifconfig {prefix}r5-eth0 {subnet}.3.4 netmask 255.255.255.0")
+    r5.cmd(f"ifconfig {prefix}r5-eth1 {subnet}.7.4 netmask 255.255.255.0")
 
-    r2.cmd("ifconfig r2-eth0 0")
-    r2.cmd("ifconfig r2-eth1 0")
+    r2.cmd(f"ifconfig {prefix}r2-eth0 0")
+    r2.cmd(f"ifconfig {prefix}r2-eth1 0")
 
     r2.cmd("echo 1 > /proc/sys/net/ipv4/ip_forward")
     r2.cmd("echo 1 > /proc/sys/net/ipv4/conf/all/proxy_arp")
 
-    r2.cmd("ifconfig r2-eth0 10.0.6.2 netmask 255.255.255.0")
-    r2.cmd("ifconfig r2-eth1 10.0.4.2 netmask 255.255.255.0")
+    r2.cmd(f"ifconfig {prefix}r2-eth0 {subnet}.6.2 netmask 255.255.255.0")
+    r2.cmd(f"ifconfig {prefix}r2-eth1 {subnet}.4.2 netmask 255.255.255.0")
 
-    r3.cmd("ifconfig r3-eth0 0")
-    r3.cmd("ifconfig r3-eth1 0")
+    r3.cmd(f"ifconfig {prefix}r3-eth0 0")
+    r3.cmd(f"ifconfig {prefix}r3-eth1 0")
 
     r3.cmd("echo 1 > /proc/sys/net/ipv4/ip_forward")
     r3.cmd("echo 1 > /proc/sys/net/ipv4/conf/all/proxy_arp")
 
-    r3.cmd("ifconfig r3-eth0 10.0.7.2 netmask 255.255.255.0")
-    r3.cmd("ifconfig r3-eth1 10.0.5.2 netmask 255.255.255.0")
+    r3.cmd(f"ifconfig {prefix}r3-eth0 {subnet}.7.2 netmask 255.255.255.0")
+    r3.cmd(f"ifconfig {prefix}r3-eth1 {subnet}.5.2 netmask 255.255.255.0")
 
-    r2.cmd("ip route add 10.0.1.0/24 via 10.0.6.4")
-    r3.cmd("ip route add 10.0.1.0/24 via 10.0.7.4")
+    r2.cmd(f"ip route add {subnet}.1.0/24 via {subnet}.6.4")
+    r3.cmd(f"ip route add {subnet}.1.0/24 via {subnet}.7.4")
 
-    r1.cmd("ip route add 10.0.4.0/24 via 10.0.2.4")
-    r1.cmd("ip route add 10.0.5.0/24 via 10.0.3.4")
+    r1.cmd(f"ip route add {subnet}.4.0/24 via {subnet}.2.4")
+    r1.cmd(f"ip route add {subnet}.5.0/24 via {subnet}.3.4")
 
-    r4.cmd("ip route add 10.0.1.0/24 via 10.0.2.1")
-    r5.cmd("ip route add 10.0.1.0/24 via 10.0.3.1")
-    r4.cmd("ip route add 10.0.4.0/24 via 10.0.6.2")
-    r5.cmd("ip route add 10.0.5.0/24 via 10.0.7.2")
+    r4.cmd(f"ip route add {subnet}.1.0/24 via {subnet}.2.1")
+    r5.cmd(f"ip route add {subnet}.1.0/24 via {subnet}.3.1")
+    r4.cmd(f"ip route add {subnet}.4.0/24 via {subnet}.6.2")
+    r5.cmd(f"ip route add {subnet}.5.0/24 via {subnet}.7.2")
 
-    h1.cmd("ifconfig h1-eth0 0")
+    h1.cmd(f"ifconfig {prefix}h1-eth0 0")
 
-    h2.cmd("ifconfig h2-eth0 0")
-    h2.cmd("ifconfig h2-eth1 0")
+    h2.cmd(f"ifconfig {prefix}h2-eth0 0")
+    h2.cmd(f"ifconfig {prefix}h2-eth1 0")
 
-    h1.cmd("ifconfig h1-eth0 10.0.1.2 netmask 255.255.255.0")
+    h1.cmd(f"ifconfig {prefix}h1-eth0 {subnet}.1.2 netmask 255.255.255.0")
 
-    h2.cmd("ifconfig h2-eth0 10.0.4.3 netmask 255.255.255.0")
-    h2.cmd("ifconfig h2-eth1 10.0.5.3 netmask 255.255.255.0")
+    h2.cmd(f"ifconfig {prefix}h2-eth0 {subnet}.4.3 netmask 255.255.255.0")
+    h2.cmd(f"ifconfig {prefix}h2-eth1 {subnet}.5.3 netmask 255.255.255.0")
 
-    h1.cmd("ip route add default scope global nexthop via 10.0.1.1 dev h1-eth0")
+    h1.cmd(f"ip route add default scope global nexthop via {subnet}.1.1 dev {prefix}h1-eth0")
 
-    h2.cmd("ip rule add from 10.0.4.3 table 1")
-    h2.cmd("ip rule add from 10.0.5.3 table 2")
+    h2.cmd(f"ip rule add from {subnet}.4.3 table 1")
+    h2.cmd(f"ip rule add from {subnet}.5.3 table 2")
 
-    h2.cmd("ip route add 10.0.6.0/24 dev h2-eth0 table 1")
-    h2.cmd("ip route add 10.0.4.0/24 dev h2-eth0 table 1")
-    h2.cmd("ip route add 10.0.2.0/24 dev h2-eth0 table 1")
-    h2.cmd("ip route add 10.0.1.0/24 dev h2-eth0 table 1")
+    h2.cmd(f"ip route add {subnet}.6.0/24 dev {prefix}h2-eth0 table 1")
+    h2.cmd(f"ip route add {subnet}.4.0/24 dev {prefix}h2-eth0 table 1")
+    h2.cmd(f"ip route add {subnet}.2.0/24 dev {prefix}h2-eth0 table 1")
+    h2.cmd(f"ip route add {subnet}.1.0/24 dev {prefix}h2-eth0 table 1")
 
-    h2.cmd("ip route add 10.0.7.0/24 dev h2-eth1 table 2")
-    h2.cmd("ip route add 10.0.5.0/24 dev h2-eth1 table 2")
-    h2.cmd("ip route add 10.0.3.0/24 dev h2-eth1 table 2")
-    h2.cmd("ip route add 10.0.1.0/24 dev h2-eth1 table 2")
+    h2.cmd(f"ip route add {subnet}.7.0/24 dev {prefix}h2-eth1 table 2")
+    h2.cmd(f"ip route add {subnet}.5.0/24 dev {prefix}h2-eth1 table 2")
+    h2.cmd(f"ip route add {subnet}.3.0/24 dev {prefix}h2-eth1 table 2")
+    h2.cmd(f"ip route add {subnet}.1.0/24 dev {prefix}h2-eth1 table 2")
 
-    h2.cmd("ip route add default scope global nexthop via 10.0.4.2 dev h2-eth0")
+    h2.cmd(f"ip route add default scope global nexthop via {subnet}.4.2 dev {prefix}h2-eth0")
 
-    network_thread1 = NetworkConfigThread(net, 'r3', 'r3-eth1', 3, barrier, timestamp_5g, update_event, data_files['5G'])
-    network_thread3 = NetworkConfigThread(net, 'r5', 'r5-eth0', 2, barrier, timestamp_5g, update_event, data_files['5G'])
+    for i, client in enumerate(client_hosts, start=1):
+        client.cmd(f"ifconfig {prefix}c{i}-eth0 {client_ip(subnet, i)} netmask 255.255.255.0 && "
+                   f"ip route add default via {subnet}.4.2 dev {prefix}c{i}-eth0")
 
-    network_thread2 = NetworkConfigThread(net, 'r2', 'r2-eth1', 3, barrier, timestamp_starlink, update_event, data_files['Starlink'])
-    network_thread4 = NetworkConfigThread(net, 'r4', 'r4-eth0', 2, barrier, timestamp_starlink, update_event, data_files['Starlink'])
+    link_specs = [
+        (f'{prefix}r3', f'{prefix}r3-eth1', 3, data_files['5G']),
+        (f'{prefix}r5', f'{prefix}r5-eth0', 2, data_files['5G']),
+        (f'{prefix}r2', f'{prefix}r2-eth1', 3, data_files['Starlink']),
+        (f'{prefix}r4', f'{prefix}r4-eth0', 2, data_files['Starlink'])
+    ]
+    init_flags = {dev: False for _, dev, _, _ in link_specs}
+    barrier = threading.Barrier(len(link_specs), action=record_tick_completion)
 
-    network_thread1.start()
-    network_thread3.start()
-    network_thread2.start()
-    network_thread4.start()
-
-    update_thread = threading.Thread(
-        target=update_lines_based_on_wall_time,
-        args=(update_event,)
-    )
-    update_thread.start()
+    if args.engine == 'async':
+        run_async_engine(net, link_specs, args.start_time, args.deadline_ms, prestage_handovers, run_log_dir, start_test_once)
+    elif args.engine == 'process':
+        run_process_engine(net, link_specs, args.start_time, args.deadline_ms, args.shared_traces, prestage_handovers, run_log_dir, start_test_once)
+    else:
+        timestamps = {
+            data_files['5G']: timestamp_5g,
+            data_files['Starlink']: timestamp_starlink
+        }
+        for host_name, dev, column, data_file in link_specs:
+            network_thread = NetworkConfigThread(net, host_name, dev, column, barrier, timestamps[data_file], update_event, data_file)
+            network_thread.start()
+
+        update_thread = threading.Thread(
+            name='update_lines',
+            target=update_lines_based_on_wall_time,
+            args=(update_event,)
+        )
+        update_thread.start()
@@ -0,0 +1,184 @@
+import os
+import csv
+import shlex
+from array import array
+
+TRACE_COLUMNS = 7
+TRACE_STEP_MS = 100
+HANDOVER_TIMES_MS = (12000, 27000, 42000, 57000)
+# Sidecar columns: uplink p10/p50/p90, downlink p10/p50/p90, wall_time.
+JITTER_PERCENTILE_SPREAD = 2.5631
+
+_trace_cache = {}
+_shaping_mode = 'tbf'
+
+class LinkTrace:
+    def __init__(self, data_file, data=None, ncols=TRACE_COLUMNS):
+        self.data_file = data_file
+        self.ncols = ncols
+        self.data = data if data is not None else self.read_csv_data()
+        self.num_lines = len(self.data) // ncols
+        self.timestamp_to_line = self.create_timestamp_index()
+        self.first_timestamp = min(self.timestamp(i) for i in range(self.num_lines))
+        last_timestamp = max(self.timestamp(i) for i in range(self.num_lines))
+        self.total_duration = last_timestamp - self.first_timestamp + TRACE_STEP_MS
+        self.handover_steps = {}
+        self.jitter = None
+
+    def read_csv_data(self):
+        data = array('d')
+        with open(self.data_file, 'r') as file:
+            reader = csv.reader(file)
+            for line in reader:
+                if line:
+                    data.extend(float(value) for value in line)
+        return data
+
+    def create_timestamp_index(self):
+        # Regular 100 ms traces are indexed arithmetically, which keeps the
+        # per-trace footprint down to the raw values.
+        first = self.timestamp(0)
+        if all(self.timestamp(i) == first + i * TRACE_STEP_MS for i in range(self.num_lines)):
+            return None
+        timestamp_index = {}
+        for idx in range(self.num_lines):
+            timestamp_index[self.timestamp(idx)] = idx
+        return timestamp_index
+
+    def timestamp(self, line_num):
+        return int(self.data[line_num * self.ncols + self.ncols - 1])
+
+    def value(self, line_num, column):
+        return self.data[line_num * self.ncols + column]
+
+    def effective_timestamp(self, virtual_timestamp):
+        return ((virtual_timestamp - self.first_timestamp) % self.total_duration) + self.first_timestamp
+
+    def find_line_number(self, timestamp):
+        if self.timestamp_to_line is not None:
+            return self.timestamp_to_line.get(timestamp)
+        offset = timestamp - self.first_timestamp
+        if offset % TRACE_STEP_MS != 0 or not 0 <= offset // TRACE_STEP_MS < self.num_lines:
+            return None
+        return offset // TRACE_STEP_MS
+
+    def closest_line_number(self, timestamp):
+        if self.timestamp_to_line is not None:
+            closest_timestamp = min(self.timestamp_to_line, key=lambda t: abs(t - timestamp))
+            return self.timestamp_to_line[closest_timestamp]
+        idx = round((timestamp - self.first_timestamp) / TRACE_STEP_MS)
+        return min(max(idx, 0), self.num_lines - 1)
+
+    def link_params(self, line_num, column):
+        bw = self.value(line_num, column - 2)
+        delay = self.value(line_num, column)
+        if '5G' in self.data_file:
+            loss = 1.0
+        else:
+            loss = self.value(line_num, column + 2) * 100
+        return bw, delay, loss, self.jitter_params(line_num, column)
+
+    def jitter_params(self, line_num, column):
+        # The p10-p90 spread of the round trips within the interval gives the
+        # netem jitter; a long upper tail selects the paretonormal table.
+        if self.jitter is None:
+            return None
+        base = (column - 2) * 3
+        p10, p50, p90 = (self.jitter.value(line_num, base + i) for i in range(3))
+        jitter = (p90 - p10) / JITTER_PERCENTILE_SPREAD
+        if jitter < 0.1:
+            return None
+        distribution = 'paretonormal' if p90 - p50 > 2 * (p50 - p10) else 'normal'
+        return round(jitter, 3), distribution
+
+    def find_handover_steps(self, column, delay_threshold=10.0, bw_ratio=0.5):
+        # Lines on the handover schedule whose delay or rate differs sharply
+        # from the previous line; these are applied ahead of the tick.
+        if column in self.handover_steps:
+            return self.handover_steps[column]
+        steps = set()
+        for line_num in range(1, self.num_lines):
+            if self.timestamp(line_num) % (60 * 1000) not in HANDOVER_TIMES_MS:
+                continue
+            delay_change = abs(self.value(line_num, column) - self.value(line_num - 1, column))
+            bw = self.value(line_num, column - 2)
+            previous_bw = self.value(line_num - 1, column - 2)
+            if delay_change > delay_threshold or abs(bw - previous_bw) > bw_ratio * max(bw, previous_bw):
+                steps.add(line_num)
+        self.handover_steps[column] = steps
+        return steps
+
+def load_trace(data_file):
+    if data_file not in _trace_cache:
+        _trace_cache[data_file] = LinkTrace(data_file)
+    return _trace_cache[data_file]
+
+def use_trace(data_file, trace):
+    _trace_cache[data_file] = trace
+
+def jitter_file(data_file):
+    return os.path.splitext(data_file)[0] + '.jitter.csv'
+
+def load_jitter(data_file, jitter=None):
+    trace = load_trace(data_file)
+    path = jitter_file(data_file)
+    if jitter is None:
+        if not os.path.exists(path):
+            print(f"No jitter table {path}; {data_file} is replayed without jitter.")
+            return False
+        jitter = LinkTrace(path)
+    if jitter.num_lines != trace.num_lines or jitter.first_timestamp != trace.first_timestamp:
+        raise ValueError(f"Jitter table {path} does not cover the same rows as {data_file}.")
+    trace.jitter = jitter
+    return True
+
+def set_shaping_mode(mode):
+    global _shaping_mode
+    _shaping_mode = mode
+
+def netem_limit(bw, delay):
+    # netem holds both the packets in flight and the rate queue; size it for
+    # the delay plus the same 50 ms of queueing the tbf setup allows.
+    return max(1000, int(bw * 1e6 / 8 * (delay + 50) / 1000 / 1500) + 1)
+
+def netem_delay(delay, jitter):
+    if jitter is None:
+        return f'delay {delay}ms'
+    jitter_ms, distribution = jitter
+    return f'delay {delay}ms {jitter_ms}ms distribution {distribution}'
+
+def shaping_commands(dev, bw, delay, loss, jitter=None, initial=False):
+    if _shaping_mode == 'netem':
+        action = 'replace' if initial else 'change'
+        return [
+            f'tc qdisc {action} dev {dev} root handle 1: netem rate {bw}mbit {netem_delay(delay, jitter)} loss {loss}% limit {netem_limit(bw, delay)}',
+        ]
+    if initial:
+        return [
+            f'tc qdisc replace dev {dev} root handle 1: tbf rate {bw}mbit burst 15k latency 50ms',
+            f'tc qdisc add dev {dev} parent 1:1 handle 10: netem {netem_delay(delay, jitter)} loss {loss}%',
+        ]
+    return [
+        f'tc qdisc change dev {dev} root handle 1: tbf rate {bw}mbit burst 15k latency 50ms',
+        f'tc qdisc change dev {dev} parent 1:1 handle 10: netem {netem_delay(delay, jitter)} loss {loss}%',
+    ]
+
+def batch_command(cmds):
+    # A single tc process applies every change back to back over one netlink
+    # socket, so rate and delay switch together instead of a tick apart.
+    lines = ' '.join(shlex.quote(cmd[len('tc '):]) for cmd in cmds)
+    return f"printf '%s\\n' {lines} | tc -batch -"
+
+class HandoverStager:
+    def __init__(self, dev, lead_ms=5.0):
+        self.dev = dev
+        self.lead_ms = lead_ms
+
+    def issue_time_ms(self, boundary_ms):
+        return boundary_ms - self.lead_ms
+
+    def record(self, virtual_timestamp, boundary_ms, issued_ms, completed_ms):
+        latency_ms = completed_ms - issued_ms
+        self.lead_ms = 0.8 * self.lead_ms + 0.2 * latency_ms
+        print(f"[{self.dev}] Handover at virtual timestamp {virtual_timestamp} ms: landed {completed_ms - boundary_ms:+.1f} ms from boundary, "
+              f"batch took {latency_ms:.1f} ms")
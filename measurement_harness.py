@@ -0,0 +1,87 @@
+import os
+import time
+from subprocess import DEVNULL
+
+PROFILES = {
+    'smoke': {'duration': 30, 'iperf3_args': [], 'irtt_interval': '10ms'},
+    'bulk': {'duration': 300, 'iperf3_args': ['-P', '4'], 'irtt_interval': '10ms'},
+    'paced': {'duration': 300, 'iperf3_args': ['-b', '10M'], 'irtt_interval': '10ms'},
+    'latency': {'duration': 600, 'iperf3_args': ['-b', '1M'], 'irtt_interval': '10ms'},
+    'soak': {'duration': 3600, 'iperf3_args': [], 'irtt_interval': '20ms'},
+}
+
+IPERF3_BASE_PORT = 5201
+IRTT_PORT = 2112
+NICE = ['nice', '-n', '10']
+
+def measurement_paths(net, prefix, subnet, clients=0):
+    # Client address on the multihomed h2 selects the path through its
+    # source-based routing tables; the servers live on h1. Fan-out clients
+    # sit on the Starlink segment and share its shaped link.
+    h2 = net.get(f'{prefix}h2')
+    paths = {
+        'starlink': (h2, f'{subnet}.4.3'),
+        '5G': (h2, f'{subnet}.5.3'),
+    }
+    for i in range(1, clients + 1):
+        paths[f'c{i}'] = (net.get(f'{prefix}c{i}'), client_ip(subnet, i))
+    return paths
+
+def client_ip(subnet, index):
+    return f'{subnet}.4.{10 + index}'
+
+def start_servers(server, server_ip, paths):
+    servers = [server.popen(NICE + ['irtt', 'server', '-b', f'{server_ip}:{IRTT_PORT}'], stdout=DEVNULL, stderr=DEVNULL)]
+    for idx, _ in enumerate(paths):
+        servers.append(server.popen(NICE + ['iperf3', '-s', '-B', server_ip, '-p', str(IPERF3_BASE_PORT + idx)], stdout=DEVNULL, stderr=DEVNULL))
+    time.sleep(1)
+    return servers
+
+def run_profile(server_ip, paths, profile_name, profile, run_dir):
+    duration = profile['duration']
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    clients = []
+    for idx, (path_name, (client, local_ip)) in enumerate(paths.items()):
+        iperf3_dir = os.path.join(run_dir, path_name, 'iperf3')
+        irtt_dir = os.path.join(run_dir, path_name, 'irtt')
+        os.makedirs(iperf3_dir, exist_ok=True)
+        os.makedirs(irtt_dir, exist_ok=True)
+
+        iperf3_file = open(os.path.join(iperf3_dir, f'{profile_name}_{stamp}.json'), 'w')
+        iperf3_cmd = NICE + ['iperf3', '-c', server_ip, '-p', str(IPERF3_BASE_PORT + idx), '-B', local_ip,
+                             '-t', str(duration), '-i', '0.1', '--bidir', '-J'] + profile['iperf3_args']
+        clients.append((f'{path_name} iperf3', client.popen(iperf3_cmd, stdout=iperf3_file, stderr=DEVNULL), iperf3_file))
+
+        irtt_file = open(os.path.join(irtt_dir, f'{profile_name}_{stamp}.json'), 'w')
+        irtt_cmd = NICE + ['irtt', 'client', '-Q', '-i', profile['irtt_interval'], '-d', f'{duration}s',
+                           f'--local={local_ip}:0', '-o', '-', f'{server_ip}:{IRTT_PORT}']
+        clients.append((f'{path_name} irtt', client.popen(irtt_cmd, stdout=irtt_file, stderr=DEVNULL), irtt_file))
+
+    failed = 0
+    for name, proc, output_file in clients:
+        rc = proc.wait()
+        output_file.close()
+        if rc != 0:
+            failed += 1
+            print(f"[harness] {profile_name}: {name} exited with code {rc}")
+    return failed
+
+def run_profiles(net, prefix, subnet, profile_names, output_dir, clients=0):
+    os.nice(10)
+    server = net.get(f'{prefix}h1')
+    server_ip = f'{subnet}.1.2'
+    paths = measurement_paths(net, prefix, subnet, clients)
+    run_root = os.path.join(output_dir, time.strftime('%Y%m%d-%H%M%S'))
+
+    servers = start_servers(server, server_ip, paths)
+    try:
+        for profile_name in profile_names:
+            profile = PROFILES[profile_name]
+            run_dir = os.path.join(run_root, profile_name)
+            print(f"[harness] Running profile {profile_name} for {profile['duration']} s on {len(paths)} paths: {', '.join(paths)}")
+            failed = run_profile(server_ip, paths, profile_name, profile, run_dir)
+            print(f"[harness] Profile {profile_name} finished with {failed} failed clients, results in {run_dir}")
+    finally:
+        for proc in servers:
+            proc.terminate()
+            proc.wait()
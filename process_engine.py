@@ -0,0 +1,223 @@
+import os
+import time
+import signal
+import subprocess
+from multiprocessing import get_context
+from queue import Empty
+from link_control import HandoverStager, batch_command, load_trace, shaping_commands
+from trace_shm import close_trace, publish_trace
+from run_log import RunLog
+import profiling
+
+TICK_MS = 100
+REPORT_INTERVAL_TICKS = 600
+STOP_TICK = -1
+
+class ShellChannel:
+    def __init__(self, pid, name):
+        self.name = name
+        self.proc = subprocess.Popen(
+            ['mnexec', '-a', str(pid), 'sh'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1
+        )
+
+    def run(self, cmds):
+        # Every link of the namespace shares this batch; any failing command
+        # fails it, not just the last one.
+        self.proc.stdin.write('rc=0\n' + ''.join(f'{cmd} || rc=$?\n' for cmd in cmds) + 'echo __done__ $rc\n')
+        self.proc.stdin.flush()
+        output = []
+        for line in self.proc.stdout:
+            line = line.rstrip('\n')
+            if line.startswith('__done__ '):
+                return int(line.split()[1]), output
+            output.append(line)
+        raise ConnectionError(f"Command channel for {self.name} closed.")
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait()
+
+def namespace_worker(name, pid, links, tick_counter, start_wall_ms, start_virtual, deadline_ms, reports, ready, prestage_handovers=True, run_log_dir=None):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    profiling.start_worker(name)
+    channel = ShellChannel(pid, name)
+    run_log = RunLog(os.path.join(run_log_dir, f'{name}.bin'), [dev for dev, _, _ in links]) if run_log_dir else None
+
+    initial_cmds = []
+    initial_params = []
+    for idx, (dev, column, trace) in enumerate(links):
+        line_num = trace.closest_line_number(trace.effective_timestamp(start_virtual))
+        bw, delay, loss, jitter = trace.link_params(line_num, column)
+        initial_cmds.extend(shaping_commands(dev, bw, delay, loss, jitter, initial=True))
+        initial_params.append((idx, start_virtual, bw, delay, loss))
+    start_ns = time.perf_counter_ns()
+    rc, output = channel.run(initial_cmds)
+    log_updates(run_log, initial_params, time.perf_counter_ns() - start_ns)
+    if rc != 0:
+        print(f"[{name}] Initial tc setup failed: {' '.join(output)}")
+    ready.release()
+
+    handover_steps = [trace.find_handover_steps(column) if prestage_handovers else set() for _, column, trace in links]
+    stager = HandoverStager(name)
+    staged_lines = [None] * len(links)
+    timers = profiling.thread_timers(name)
+
+    last_tick = tick_counter.value
+    applied = 0
+    late = 0
+    total_lateness_ms = 0
+    max_lateness_ms = 0
+    while True:
+        tick = tick_counter.value
+        if tick == STOP_TICK:
+            break
+        if tick == last_tick:
+            time.sleep(0.001)
+            continue
+        last_tick = tick
+
+        virtual_timestamp = start_virtual + tick * TICK_MS
+        cmds = []
+        applied_params = []
+        staged_cmds = []
+        staged_params = []
+        for idx, (dev, column, trace) in enumerate(links):
+            if timers:
+                start_ns = time.perf_counter_ns()
+            line_num = trace.find_line_number(trace.effective_timestamp(virtual_timestamp))
+            if timers:
+                timers.add('trace_lookup', start_ns)
+            if line_num is None:
+                print(f"[{trace.data_file}] Virtual timestamp {virtual_timestamp} ms not found in data file.")
+                continue
+            if line_num != staged_lines[idx]:
+                if timers:
+                    start_ns = time.perf_counter_ns()
+                bw, delay, loss, jitter = trace.link_params(line_num, column)
+                cmds.extend(shaping_commands(dev, bw, delay, loss, jitter))
+                if timers:
+                    timers.add('command_build', start_ns)
+                applied_params.append((idx, virtual_timestamp, bw, delay, loss))
+            staged_lines[idx] = None
+
+            next_line = trace.find_line_number(trace.effective_timestamp(virtual_timestamp + TICK_MS))
+            if next_line in handover_steps[idx]:
+                bw, delay, loss, jitter = trace.link_params(next_line, column)
+                staged_cmds.extend(shaping_commands(dev, bw, delay, loss, jitter))
+                staged_params.append((idx, virtual_timestamp + TICK_MS, bw, delay, loss))
+                staged_lines[idx] = next_line
+        if cmds:
+            start_ns = time.perf_counter_ns()
+            rc, output = channel.run(cmds)
+            if timers:
+                timers.add('host_cmd', start_ns)
+            log_updates(run_log, applied_params, time.perf_counter_ns() - start_ns)
+            if rc != 0:
+                print(f"[{name}] tc update failed: {' '.join(output)}")
+
+        lateness_ms = int(time.time() * 1000) - (start_wall_ms + tick * TICK_MS)
+        applied += 1
+        total_lateness_ms += lateness_ms
+        max_lateness_ms = max(max_lateness_ms, lateness_ms)
+        if lateness_ms > deadline_ms:
+            late += 1
+        if applied == REPORT_INTERVAL_TICKS:
+            reports.put((name, applied, late, total_lateness_ms / applied, max_lateness_ms))
+            applied = 0
+            late = 0
+            total_lateness_ms = 0
+            max_lateness_ms = 0
+
+        if staged_cmds:
+            boundary_ms = start_wall_ms + (tick + 1) * TICK_MS
+            time.sleep(max(0, stager.issue_time_ms(boundary_ms) - time.time() * 1000) / 1000)
+            issued_ms = time.time() * 1000
+            start_ns = time.perf_counter_ns()
+            rc, output = channel.run([batch_command(staged_cmds)])
+            log_updates(run_log, staged_params, time.perf_counter_ns() - start_ns)
+            stager.record(virtual_timestamp + TICK_MS, boundary_ms, issued_ms, time.time() * 1000)
+            if rc != 0:
+                print(f"[{name}] Staged handover failed: {' '.join(output)}")
+
+    channel.close()
+    if run_log is not None:
+        run_log.close()
+
+def log_updates(run_log, params, tc_latency_ns):
+    if run_log is None:
+        return
+    wall_ns = time.time_ns()
+    for link, virtual_timestamp, bw, delay, loss in params:
+        run_log.append(link, wall_ns, virtual_timestamp, bw, delay, loss, tc_latency_ns)
+
+def run_process_engine(net, link_specs, start_time=None, deadline_ms=80, shared_traces=False, prestage_handovers=True, run_log_dir=None, on_ready=None):
+    ctx = get_context('fork')
+    segments = {}
+    traces = {}
+    for _, _, _, data_file in link_specs:
+        if data_file in traces:
+            continue
+        if shared_traces:
+            traces[data_file] = load_trace(data_file)
+        else:
+            segments[data_file], traces[data_file] = publish_trace(data_file)
+
+    namespaces = {}
+    for host_name, dev, column, data_file in link_specs:
+        namespaces.setdefault(host_name, []).append((dev, column, traces[data_file]))
+
+    start_wall_ms = (int(time.time() * 1000) // TICK_MS) * TICK_MS
+    if start_time is not None:
+        start_virtual = start_time
+    else:
+        start_virtual = start_wall_ms % (60 * 1000)
+    print(f"[process] Virtual time starts at {start_virtual} ms at wall time {start_wall_ms} ms")
+
+    tick_counter = ctx.Value('q', 0, lock=False)
+    reports = ctx.Queue()
+    ready = ctx.Semaphore(0)
+    workers = []
+    for host_name, links in namespaces.items():
+        worker = ctx.Process(
+            target=namespace_worker,
+            args=(host_name, net.get(host_name).pid, links, tick_counter, start_wall_ms, start_virtual, deadline_ms, reports, ready, prestage_handovers, run_log_dir),
+            name=f'ns-{host_name}',
+            daemon=True
+        )
+        worker.start()
+        workers.append(worker)
+        profiling.add_worker(worker.pid)
+
+    # Workers count in once their initial qdiscs are applied.
+    pending = len(workers)
+    try:
+        while True:
+            current_time_ms = int(time.time() * 1000)
+            next_tick = (current_time_ms - start_wall_ms) // TICK_MS + 1
+            time.sleep(max(0, start_wall_ms + next_tick * TICK_MS - current_time_ms) / 1000)
+            tick_counter.value = (int(time.time() * 1000) - start_wall_ms) // TICK_MS
+
+            while pending and ready.acquire(block=False):
+                pending -= 1
+                if not pending and on_ready is not None:
+                    on_ready()
+
+            while True:
+                try:
+                    name, applied, late, mean_lateness_ms, max_lateness_ms = reports.get_nowait()
+                except Empty:
+                    break
+                print(f"[process] {name}: applied {applied}, late {late}, "
+                      f"mean lateness {mean_lateness_ms:.1f} ms, max lateness {max_lateness_ms} ms")
+    finally:
+        tick_counter.value = STOP_TICK
+        for worker in workers:
+            worker.join(timeout=1)
+        for data_file, segment in segments.items():
+            close_trace(traces[data_file])
+            segment.unlink()
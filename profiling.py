@@ -0,0 +1,125 @@
+import os
+import sys
+import time
+import signal
+import threading
+from collections import Counter
+
+enabled = False
+output_dir = '.'
+sample_duration_s = 10.0
+sample_interval_s = 0.005
+
+_sampler = None
+_timers = []
+_timers_lock = threading.Lock()
+_workers = []
+
+class ScopedTimers:
+    # One instance per controller thread, so updates never contend; the
+    # SIGUSR2 dump reads them from the signal handler between ticks.
+    def __init__(self, name):
+        self.name = name
+        self.stats = {}
+
+    def add(self, scope, start_ns):
+        elapsed_ns = time.perf_counter_ns() - start_ns
+        stat = self.stats.get(scope)
+        if stat is None:
+            self.stats[scope] = [1, elapsed_ns, elapsed_ns]
+        else:
+            stat[0] += 1
+            stat[1] += elapsed_ns
+            if elapsed_ns > stat[2]:
+                stat[2] = elapsed_ns
+
+def thread_timers(name):
+    if not enabled:
+        return None
+    timers = ScopedTimers(name)
+    with _timers_lock:
+        _timers.append(timers)
+    return timers
+
+def sample_stacks(duration_s, interval_s, path):
+    # Collapsed stacks ("thread;file:function;... count"), the input format of
+    # flamegraph.pl and speedscope.
+    counts = Counter()
+    own_ident = threading.get_ident()
+    sampled = set()
+    samples = 0
+    end = time.monotonic() + duration_s
+    while time.monotonic() < end:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            sampled.add(ident)
+            stack = []
+            while frame is not None:
+                stack.append(f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}')
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            counts[';'.join(reversed(stack))] += 1
+        samples += 1
+        time.sleep(interval_s)
+    with open(path, 'w') as f:
+        for stack, count in counts.most_common():
+            f.write(f'{stack} {count}\n')
+    print(f"[profile] Wrote {samples} samples of {len(sampled)} threads to {path}")
+
+def forward(signum):
+    for pid in _workers:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+def start_sampling(signum=None, frame=None):
+    global _sampler
+    forward(signal.SIGUSR1)
+    if _sampler is not None and _sampler.is_alive():
+        print("[profile] Sampling is already running.")
+        return
+    path = os.path.join(output_dir, f"profile-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+    print(f"[profile] Sampling all threads every {sample_interval_s * 1000:.0f} ms for {sample_duration_s:.0f} s")
+    _sampler = threading.Thread(target=sample_stacks, args=(sample_duration_s, sample_interval_s, path), name='profile_sampler', daemon=True)
+    _sampler.start()
+
+def dump_timers(signum=None, frame=None):
+    forward(signal.SIGUSR2)
+    with _timers_lock:
+        timers = list(_timers)
+    print("[profile] Scoped timers since the last dump:")
+    print(f"{'thread':<16}{'scope':<16}{'count':>8}{'mean us':>10}{'max us':>10}{'total ms':>10}")
+    for scoped in timers:
+        stats, scoped.stats = scoped.stats, {}
+        for scope, (count, total_ns, max_ns) in sorted(stats.items()):
+            print(f"{scoped.name:<16}{scope:<16}{count:>8}{total_ns / count / 1000:>10.1f}{max_ns / 1000:>10.1f}{total_ns / 1e6:>10.1f}")
+
+def enable(directory='.', duration_s=10.0, interval_ms=5.0):
+    global enabled, output_dir, sample_duration_s, sample_interval_s
+    enabled = True
+    output_dir = directory
+    sample_duration_s = duration_s
+    sample_interval_s = interval_ms / 1000
+    os.makedirs(output_dir, exist_ok=True)
+    signal.signal(signal.SIGUSR1, start_sampling)
+    signal.signal(signal.SIGUSR2, dump_timers)
+    print(f"[profile] kill -USR1 {os.getpid()} samples for {duration_s:.0f} s into {output_dir}; kill -USR2 {os.getpid()} prints the scoped timers")
+
+def add_worker(pid):
+    # Controllers in forked workers are sampled and timed in the worker; the
+    # parent passes both signals on.
+    if enabled:
+        _workers.append(pid)
+
+def start_worker(name):
+    # Called first thing in a forked worker: the handlers are inherited, but
+    # the parent's timers, sampler and worker list are not this process's.
+    global _sampler
+    threading.current_thread().name = name
+    with _timers_lock:
+        _timers.clear()
+    _workers.clear()
+    _sampler = None
@@ -0,0 +1,97 @@
+import os
+import glob
+import mmap
+import struct
+import argparse
+
+MAGIC = b'SLRUNLOG'
+HEADER_SIZE = 4096
+HEADER = struct.Struct('<8sIIQ')
+COUNT = struct.Struct('<Q')
+COUNT_OFFSET = HEADER.size
+LINKS_OFFSET = COUNT_OFFSET + COUNT.size
+ENTRY = struct.Struct('<qqIfffq')
+ENTRY_FIELDS = ['wall_ns', 'virtual_ts', 'link', 'bw_mbit', 'delay_ms', 'loss_pct', 'tc_latency_ns']
+DEFAULT_CAPACITY = 24 * 60 * 60 * 10
+
+class RunLog:
+    # Fixed-size records in a preallocated, memory-mapped file. The file is
+    # sparse, so disk use grows with the records actually written.
+    def __init__(self, path, links, capacity=DEFAULT_CAPACITY):
+        self.path = path
+        self.capacity = capacity * len(links)
+        self.count = 0
+        self.full = False
+        names = '\n'.join(links).encode()
+        if LINKS_OFFSET + len(names) > HEADER_SIZE:
+            raise ValueError(f"Too many link names for run log {path}.")
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        os.ftruncate(self.fd, HEADER_SIZE + self.capacity * ENTRY.size)
+        self.mm = mmap.mmap(self.fd, HEADER_SIZE + self.capacity * ENTRY.size)
+        HEADER.pack_into(self.mm, 0, MAGIC, 1, ENTRY.size, self.capacity)
+        COUNT.pack_into(self.mm, COUNT_OFFSET, 0)
+        self.mm[LINKS_OFFSET:LINKS_OFFSET + len(names)] = names
+
+    def append(self, link, wall_ns, virtual_ts, bw, delay, loss, tc_latency_ns):
+        if self.count == self.capacity:
+            if not self.full:
+                self.full = True
+                print(f"Run log {self.path} is full; further updates are not recorded.")
+            return
+        ENTRY.pack_into(self.mm, HEADER_SIZE + self.count * ENTRY.size, wall_ns, virtual_ts, link, bw, delay, loss, tc_latency_ns)
+        self.count += 1
+        COUNT.pack_into(self.mm, COUNT_OFFSET, self.count)
+
+    def close(self):
+        self.mm.flush()
+        self.mm.close()
+        os.close(self.fd)
+
+def read_run_log(path):
+    import numpy as np
+    import pandas as pd
+
+    if os.path.isdir(path):
+        files = sorted(glob.glob(os.path.join(path, '*.bin')))
+    else:
+        files = [path]
+
+    dtype = np.dtype([
+        ('wall_ns', '<i8'), ('virtual_ts', '<i8'), ('link', '<u4'),
+        ('bw_mbit', '<f4'), ('delay_ms', '<f4'), ('loss_pct', '<f4'), ('tc_latency_ns', '<i8')
+    ])
+    frames = []
+    for filename in files:
+        with open(filename, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+            magic, version, entry_size, capacity = HEADER.unpack_from(header, 0)
+            if magic != MAGIC or entry_size != dtype.itemsize:
+                print(f'Skipping {filename}: not a run log')
+                continue
+            count = COUNT.unpack_from(header, COUNT_OFFSET)[0]
+            links = header[LINKS_OFFSET:].rstrip(b'\0').decode().split('\n')
+            records = np.fromfile(f, dtype=dtype, count=count)
+        df = pd.DataFrame(records)
+        df['link'] = pd.Categorical.from_codes(df['link'], categories=links)
+        frames.append(df)
+
+    if not frames:
+        return pd.DataFrame(columns=ENTRY_FIELDS)
+    df = pd.concat(frames, ignore_index=True)
+    df['link'] = df['link'].astype(str)
+    return df.sort_values(['wall_ns', 'link'], kind='stable').reset_index(drop=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Read emulator run logs')
+    parser.add_argument('path', help='Run log file or the directory passed to --run_log')
+    parser.add_argument('--csv', default=None, help='Write the decoded records to this CSV file')
+    args = parser.parse_args()
+
+    df = read_run_log(args.path)
+    print(f'{len(df)} link updates recorded')
+    if not df.empty:
+        summary = df.groupby('link')['tc_latency_ns'].describe(percentiles=[0.5, 0.99]) / 1e6
+        print('tc latency per link (ms):')
+        print(summary[['count', 'mean', '50%', '99%', 'max']].assign(count=df.groupby('link').size()))
+    if args.csv:
+        df.to_csv(args.csv, index=False)
@@ -0,0 +1,95 @@
+import re
+import json
+import time
+import argparse
+from mininet.link import TCLink
+from mininet.log import setLogLevel
+from mininet.net import Mininet
+from link_control import set_shaping_mode, shaping_commands
+
+def read_busy_jiffies():
+    with open('/proc/stat', 'r') as f:
+        fields = [int(value) for value in f.readline().split()[1:]]
+    idle = fields[3] + fields[4]
+    return sum(fields) - idle, sum(fields)
+
+def ping_rtt(host, target, count, interval=0.2):
+    output = host.cmd(f'ping -c {count} -i {interval} {target}')
+    match = re.search(r'= [\d.]+/([\d.]+)/', output)
+    return float(match.group(1)) if match else None
+
+def measure_control_plane(host, dev, bw, delay, ticks):
+    start = time.perf_counter()
+    commands = 0
+    for i in range(ticks):
+        cmds = shaping_commands(dev, bw + (i % 2) * 0.5, delay + (i % 2) * 0.5, 0.0)
+        for cmd in cmds:
+            host.cmd(cmd)
+        commands += len(cmds)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return elapsed_ms / ticks, commands / ticks
+
+def run_case(h1, h2, mode, bw, delay, duration, ticks):
+    set_shaping_mode(mode)
+    dev = 'h1-eth0'
+    h1.cmd(f'tc qdisc del dev {dev} root')
+    for cmd in shaping_commands(dev, bw, delay, 0.0, initial=True):
+        h1.cmd(cmd)
+
+    base_rtt = ping_rtt(h1, h2.IP(), 10)
+
+    server = h2.popen(['iperf3', '-s', '-1'])
+    time.sleep(0.5)
+    busy_before, total_before = read_busy_jiffies()
+    client = h1.popen(['iperf3', '-c', h2.IP(), '-t', str(duration), '-J'])
+    time.sleep(min(2, duration / 4))
+    loaded_rtt = ping_rtt(h1, h2.IP(), int((duration - 3) / 0.2))
+    report = json.loads(client.communicate()[0])
+    busy_after, total_after = read_busy_jiffies()
+    server.wait()
+
+    achieved = report['end']['sum_received']['bits_per_second'] / 1e6
+    ms_per_tick, cmds_per_tick = measure_control_plane(h1, dev, bw, delay, ticks)
+    return {
+        'mode': mode,
+        'rate_mbit': bw,
+        'achieved_mbit': achieved,
+        'accuracy': achieved / bw,
+        'queueing_delay_ms': loaded_rtt - base_rtt if loaded_rtt is not None and base_rtt is not None else None,
+        'cpu_busy': (busy_after - busy_before) / max(1, total_after - total_before),
+        'tc_cmds_per_tick': cmds_per_tick,
+        'tc_ms_per_tick': ms_per_tick,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare tbf+netem and netem-only link shaping')
+    parser.add_argument('--rates', type=float, nargs='+', default=[25, 50, 100, 200, 350], help='Shaped rates in Mbit/s')
+    parser.add_argument('--delay', type=float, default=30.0, help='One-way netem delay in ms')
+    parser.add_argument('--duration', type=int, default=15, help='iperf3 duration per case in seconds')
+    parser.add_argument('--ticks', type=int, default=200, help='Control-plane updates timed per case')
+    parser.add_argument('--output', default=None, help='Optional JSON file for the results')
+    args = parser.parse_args()
+
+    setLogLevel('warning')
+    net = Mininet(link=TCLink)
+    h1 = net.addHost('h1')
+    h2 = net.addHost('h2')
+    net.addLink(h1, h2)
+    net.build()
+
+    results = []
+    try:
+        for bw in args.rates:
+            for mode in ('tbf', 'netem'):
+                result = run_case(h1, h2, mode, bw, args.delay, args.duration, args.ticks)
+                results.append(result)
+                print(f"{mode:>5} {bw:7.1f} Mbit/s: achieved {result['achieved_mbit']:7.2f} "
+                      f"({result['accuracy'] * 100:5.1f}%), queueing {result['queueing_delay_ms']} ms, "
+                      f"cpu {result['cpu_busy'] * 100:4.1f}%, {result['tc_cmds_per_tick']:.0f} tc cmds "
+                      f"/ {result['tc_ms_per_tick']:.2f} ms per tick")
+    finally:
+        net.stop()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,93 @@
+import os
+import re
+import atexit
+import struct
+import hashlib
+import argparse
+from multiprocessing import resource_tracker, shared_memory
+from link_control import LinkTrace, jitter_file, load_jitter, load_trace, use_trace
+
+HEADER = struct.Struct('<8sQQ')
+MAGIC = b'STRACE01'
+
+def segment_name(data_file):
+    path = os.path.abspath(data_file)
+    base = re.sub(r'[^A-Za-z0-9]', '_', os.path.basename(path))
+    return f'strace_{base}_{hashlib.sha1(path.encode()).hexdigest()[:12]}'
+
+def publish_trace(data_file, name=None):
+    trace = load_trace(data_file)
+    size = len(trace.data) * trace.data.itemsize
+    shm = shared_memory.SharedMemory(name=name, create=True, size=HEADER.size + size)
+    HEADER.pack_into(shm.buf, 0, MAGIC, trace.num_lines, trace.ncols)
+    shm.buf[HEADER.size:HEADER.size + size] = memoryview(trace.data).cast('B')
+    view = trace_view(shm, data_file)
+    view.jitter = trace.jitter
+    return shm, view
+
+def trace_view(shm, data_file):
+    magic, num_lines, ncols = HEADER.unpack_from(shm.buf, 0)
+    if magic != MAGIC:
+        raise ValueError(f"Shared memory segment {shm.name} does not hold a trace.")
+    raw = shm.buf[HEADER.size:HEADER.size + num_lines * ncols * 8]
+    values = raw.cast('d')
+    trace = LinkTrace(data_file, values.toreadonly(), ncols)
+    trace.segment = shm
+    trace.views = (raw, values, trace.data)
+    return trace
+
+def close_trace(trace):
+    # The segment can only be closed once every view into it is released.
+    for view in reversed(trace.views):
+        view.release()
+    trace.segment.close()
+
+def attach_segment(data_file):
+    # Segments published by this script outlive any single emulator, so the
+    # attaching process must not let the resource tracker unlink them at exit.
+    shm = shared_memory.SharedMemory(name=segment_name(data_file))
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    trace = trace_view(shm, data_file)
+    atexit.register(close_trace, trace)
+    return trace
+
+def attach_trace(data_file, jitter=False):
+    try:
+        trace = attach_segment(data_file)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"No shared trace for {data_file}; run 'python trace_shm.py publish {data_file}' first.")
+    use_trace(data_file, trace)
+    if jitter:
+        try:
+            load_jitter(data_file, attach_segment(jitter_file(data_file)))
+        except FileNotFoundError:
+            print(f"No shared jitter table for {data_file}; {data_file} is replayed without jitter.")
+    return trace
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Publish traces into shared memory for emulator instances')
+    parser.add_argument('action', choices=['publish', 'unlink'])
+    parser.add_argument('data_files', nargs='+', help='Trace files, named exactly as the emulator opens them')
+    args = parser.parse_args()
+
+    for data_file in args.data_files:
+        # A jitter table next to the trace is shared alongside it.
+        for path in (data_file, jitter_file(data_file)):
+            name = segment_name(path)
+            if path != data_file and not os.path.exists(path):
+                continue
+            if args.action == 'publish':
+                shm, trace = publish_trace(path, name)
+                resource_tracker.unregister(shm._name, 'shared_memory')
+                print(f"Published {path} ({trace.num_lines} rows, {shm.size} bytes) as /dev/shm/{name}")
+                close_trace(trace)
+            else:
+                try:
+                    shm = shared_memory.SharedMemory(name=name)
+                except FileNotFoundError:
+                    if path != data_file:
+                        continue
+                    raise
+                shm.close()
+                shm.unlink()
+                print(f"Removed /dev/shm/{name}")